@@ -158,3 +158,111 @@ LOGGING = {
         },
     },
 }
+
+# Background task queue
+# Uploads are stored as ProcessingTask rows and picked up by `python manage.py process_tasks`.
+TASK_WORKER_CONCURRENCY = config('TASK_WORKER_CONCURRENCY', default=os.cpu_count() or 1, cast=int)
+TASK_POLL_INTERVAL = config('TASK_POLL_INTERVAL', default=1.0, cast=float)
+# A processing task whose heartbeat is older than this (seconds) is considered abandoned and re-queued
+TASK_LEASE_TIMEOUT = config('TASK_LEASE_TIMEOUT', default=900, cast=int)
+TASK_MAX_ATTEMPTS = config('TASK_MAX_ATTEMPTS', default=3, cast=int)
+# Completed and failed tasks are deleted this many seconds after they finish
+TASK_RESULT_TTL = config('TASK_RESULT_TTL', default=24 * 60 * 60, cast=int)
+TASK_PURGE_INTERVAL = config('TASK_PURGE_INTERVAL', default=60, cast=int)
+
+# Server-Sent Events progress stream (/api/task-events/<task_id>/)
+TASK_EVENTS_POLL_INTERVAL = config('TASK_EVENTS_POLL_INTERVAL', default=0.5, cast=float)
+TASK_EVENTS_KEEPALIVE = config('TASK_EVENTS_KEEPALIVE', default=15, cast=int)
+
+# Seconds that criteria data fetched by file_upload_app.criteria_context stays cached in memory
+CRITERIA_CACHE_TTL = config('CRITERIA_CACHE_TTL', default=3600, cast=int)
+
+# OpenAI requests. Set OPENAI_BASE_URL to point the client at another OpenAI-compatible server.
+LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', default=8, cast=int)
+LLM_REQUEST_TIMEOUT = config('LLM_REQUEST_TIMEOUT', default=120, cast=float)
+
+# Map-reduce evidence summarization (sizes in tokens, see file_upload_app.chunker)
+MAP_MAX_TOKENS = config('MAP_MAX_TOKENS', default=500, cast=int)
+REDUCE_MAX_TOKENS = config('REDUCE_MAX_TOKENS', default=1500, cast=int)
+# Input size of a single reduce call
+REDUCE_BATCH_TOKENS = config('REDUCE_BATCH_TOKENS', default=8000, cast=int)
+# Evidence notes are reduced until they fit in this many tokens of the final prompt
+EVIDENCE_TOKEN_BUDGET = config('EVIDENCE_TOKEN_BUDGET', default=6000, cast=int)
+MAX_REDUCE_ROUNDS = config('MAX_REDUCE_ROUNDS', default=4, cast=int)
+# Final prompt (file_upload_app.prompt_packing): evidence notes beyond FINAL_PROMPT_TOKEN_BUDGET are dropped,
+# least relevant first. The answer gets FINAL_OUTPUT_BASE_TOKENS plus FINAL_OUTPUT_TOKENS_PER_DOCUMENT per
+# document, at most FINAL_OUTPUT_MAX_TOKENS, and prompt plus answer stay within LLM_CONTEXT_TOKENS
+FINAL_PROMPT_TOKEN_BUDGET = config('FINAL_PROMPT_TOKEN_BUDGET', default=24000, cast=int)
+FINAL_OUTPUT_BASE_TOKENS = config('FINAL_OUTPUT_BASE_TOKENS', default=500, cast=int)
+FINAL_OUTPUT_TOKENS_PER_DOCUMENT = config('FINAL_OUTPUT_TOKENS_PER_DOCUMENT', default=250, cast=int)
+FINAL_OUTPUT_MAX_TOKENS = config('FINAL_OUTPUT_MAX_TOKENS', default=16000, cast=int)
+LLM_CONTEXT_TOKENS = config('LLM_CONTEXT_TOKENS', default=128000, cast=int)
+
+# Document chunking (file_upload_app.chunker)
+CHUNK_MAX_TOKENS = config('CHUNK_MAX_TOKENS', default=3000, cast=int)
+CHUNK_OVERLAP_TOKENS = config('CHUNK_OVERLAP_TOKENS', default=200, cast=int)
+
+# Content-addressed cache of OpenAI responses (LLMResponse table), evicted least recently used first
+LLM_CACHE_ENABLED = config('LLM_CACHE_ENABLED', default=True, cast=bool)
+LLM_CACHE_MAX_ENTRIES = config('LLM_CACHE_MAX_ENTRIES', default=50000, cast=int)
+LLM_CACHE_MAX_BYTES = config('LLM_CACHE_MAX_BYTES', default=500 * 1024 * 1024, cast=int)
+
+# Cache of extracted document text keyed by SHA-256 of the file content (gzip-compressed JSON files),
+# evicted least recently used first once it exceeds EXTRACTION_CACHE_MAX_BYTES
+EXTRACTION_CACHE_DIR = config('EXTRACTION_CACHE_DIR', default=os.path.join(BASE_DIR, 'cache', 'extraction'))
+EXTRACTION_CACHE_MAX_BYTES = config('EXTRACTION_CACHE_MAX_BYTES', default=1024 * 1024 * 1024, cast=int)
+
+# Processes used to extract the files of a task in parallel; 0 means one per CPU core. By default the
+# cores are shared between the TASK_WORKER_CONCURRENCY task workers, so the host runs about one
+# extraction sandbox per core however many tasks run at once
+EXTRACTION_WORKERS = config('EXTRACTION_WORKERS', default=max(1, (os.cpu_count() or 1) // TASK_WORKER_CONCURRENCY), cast=int)
+
+# PDF text extractor (file_upload_app.file_extractors.PDF_EXTRACTORS): 'pdfium' or 'pypdf2'
+PDF_EXTRACTOR = config('PDF_EXTRACTOR', default='pdfium')
+# PDFs with at least this many pages are split into page ranges extracted in parallel
+PDF_PARALLEL_MIN_PAGES = config('PDF_PARALLEL_MIN_PAGES', default=200, cast=int)
+
+# OCR of images and of PDF pages without a text layer (needs Tesseract with the listed languages)
+OCR_ENABLED = config('OCR_ENABLED', default=True, cast=bool)
+OCR_LANGUAGES = config('OCR_LANGUAGES', default='nor+eng')
+OCR_DPI = config('OCR_DPI', default=300, cast=int)
+# PDF pages with fewer extracted characters than this are treated as scanned and OCR'd
+OCR_MIN_PAGE_CHARS = config('OCR_MIN_PAGE_CHARS', default=20, cast=int)
+
+# Boilerplate stripping after extraction (file_upload_app.normalization): lines found on at least
+# BOILERPLATE_PAGE_RATIO of the pages of documents with at least BOILERPLATE_MIN_PAGES pages are kept once
+BOILERPLATE_MIN_PAGES = config('BOILERPLATE_MIN_PAGES', default=3, cast=int)
+BOILERPLATE_PAGE_RATIO = config('BOILERPLATE_PAGE_RATIO', default=0.5, cast=float)
+# Lines of at least LOW_INFORMATION_MIN_CHARS characters with a lower share of letters are dropped as noise
+LOW_INFORMATION_MIN_CHARS = config('LOW_INFORMATION_MIN_CHARS', default=8, cast=int)
+LOW_INFORMATION_LETTER_RATIO = config('LOW_INFORMATION_LETTER_RATIO', default=0.25, cast=float)
+
+# Tables (file_upload_app.tables): tables with more than TABLE_SUMMARY_MIN_ROWS rows and a column of which
+# at least TABLE_NUMERIC_RATIO of the values are numbers are sent as per-column statistics plus TABLE_SAMPLE_ROWS rows
+TABLE_SUMMARY_MIN_ROWS = config('TABLE_SUMMARY_MIN_ROWS', default=30, cast=int)
+TABLE_NUMERIC_RATIO = config('TABLE_NUMERIC_RATIO', default=0.5, cast=float)
+TABLE_SAMPLE_ROWS = config('TABLE_SAMPLE_ROWS', default=5, cast=int)
+
+# Every file is extracted in a sandbox process. After EXTRACTION_TIMEOUT seconds the extractor stops and
+# what it read so far is used; a sandbox still running EXTRACTION_KILL_GRACE seconds later is killed.
+# EXTRACTION_MEMORY_LIMIT_MB caps its address space (RLIMIT_AS), shared with the page-range and OCR
+# processes it starts. 0 disables a limit.
+EXTRACTION_TIMEOUT = config('EXTRACTION_TIMEOUT', default=300, cast=int)
+EXTRACTION_KILL_GRACE = config('EXTRACTION_KILL_GRACE', default=30, cast=int)
+EXTRACTION_MEMORY_LIMIT_MB = config('EXTRACTION_MEMORY_LIMIT_MB', default=2048, cast=int)
+
+# Chunk retrieval (file_upload_app.retrieval): only the RETRIEVAL_TOP_K chunks that best match the criteria's
+# description, guidance and evidence by BM25 are sent to the map stage; 0 sends every chunk
+RETRIEVAL_TOP_K = config('RETRIEVAL_TOP_K', default=10, cast=int)
+BM25_K1 = config('BM25_K1', default=1.2, cast=float)
+BM25_B = config('BM25_B', default=0.75, cast=float)
+
+# Evidence coverage (file_upload_app.coverage): TF-IDF similarity of every chunk to every evidence requirement.
+# The COVERAGE_CONTEXT_CHUNKS best chunks per requirement are mapped besides the retrieved ones, and the
+# COVERAGE_REPORT_PASSAGES best are listed in the task result; scores below COVERAGE_MIN_SCORE are ignored
+COVERAGE_CONTEXT_CHUNKS = config('COVERAGE_CONTEXT_CHUNKS', default=1, cast=int)
+COVERAGE_REPORT_PASSAGES = config('COVERAGE_REPORT_PASSAGES', default=3, cast=int)
+COVERAGE_MIN_SCORE = config('COVERAGE_MIN_SCORE', default=0.05, cast=float)
+# The map stage stops early once every evidence requirement has notes from a chunk scoring at least
+# COVERAGE_STOP_SCORE for it; 0 maps every selected chunk
+COVERAGE_STOP_SCORE = config('COVERAGE_STOP_SCORE', default=0.2, cast=float)
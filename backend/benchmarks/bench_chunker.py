@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for file_upload_app.chunker against the old word-count chunkers.
+
+Builds a Norwegian corpus from the criteria JSON in assets/, then reports throughput,
+peak traced memory, and how far chunk sizes (in tokens) stray from the limit.
+
+Run from the backend directory:  python -m benchmarks.bench_chunker --mb 5
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+from file_upload_app.chunker import chunk_text, count_tokens
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIRS = [
+    os.path.join(BENCH_DIR, '..', 'assets', 'json_files'),        # inside the Docker image
+    os.path.join(BENCH_DIR, '..', '..', 'assets', 'json_files'),  # repository checkout
+]
+
+
+def old_ai_integration_chunks(text, chunk_size=3000):
+    words = text.split()
+    return [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+
+
+def old_file_extractors_chunks(text, max_tokens=7500):
+    words = text.split()
+    chunks = []
+    current_chunk = []
+    for word in words:
+        if len(current_chunk) + len(word.split()) <= max_tokens:
+            current_chunk.append(word)
+        else:
+            chunks.append(' '.join(current_chunk))
+            current_chunk = [word]
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def load_corpus(megabytes):
+    texts = []
+
+    def collect(value):
+        if isinstance(value, str) and len(value) > 40:
+            texts.append(value)
+        elif isinstance(value, dict):
+            for item in value.values():
+                collect(item)
+        elif isinstance(value, list):
+            for item in value:
+                collect(item)
+
+    for asset_dir in ASSET_DIRS:
+        for path in glob.glob(os.path.join(asset_dir, '**', '*.json'), recursive=True):
+            with open(path, encoding='utf-8') as f:
+                collect(json.load(f))
+        if texts:
+            break
+    if not texts:
+        raise SystemExit('No criteria JSON found under assets/json_files')
+
+    sample = '\n\n'.join(texts)
+    return (sample + '\n\n') * max(1, int(megabytes * 1024 * 1024 / len(sample.encode('utf-8'))))
+
+
+def run(name, chunker, text, limit):
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = list(chunker(text))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sizes = [count_tokens(chunk) for chunk in chunks]
+    over = sum(size > limit for size in sizes)
+    print(f"{name:<28} {len(text) / elapsed / 1e6:7.2f} MB/s  peak {peak / 1e6:7.1f} MB  "
+          f"{len(chunks):5d} chunks  tokens min/avg/max {min(sizes)}/{sum(sizes) // len(sizes)}/{max(sizes)}  "
+          f"over {limit}: {over}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=5)
+    parser.add_argument('--max-tokens', type=int, default=3000)
+    parser.add_argument('--overlap', type=int, default=200)
+    args = parser.parse_args()
+
+    text = load_corpus(args.mb)
+    count_tokens('warm up')  # load the tokenizer outside the timings
+    print(f"corpus {len(text.encode('utf-8')) / 1e6:.1f} MB, limit {args.max_tokens} tokens")
+    run('ai_integration.chunk_text', old_ai_integration_chunks, text, args.max_tokens)
+    run('file_extractors.chunk_text', old_file_extractors_chunks, text, args.max_tokens)
+    run('chunker.chunk_text', lambda t: chunk_text(t, args.max_tokens, args.overlap), text, args.max_tokens)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares sending chunk prompts one by one with the bounded-concurrency dispatcher,
+against the fake OpenAI-compatible server.
+
+Run from the backend directory:  python -m benchmarks.bench_llm_dispatch --chunks 40 --latency 0.5
+"""
+import argparse
+import time
+from openai import OpenAI
+from benchmarks.fake_openai_server import start_fake_openai_server
+from file_upload_app.llm_dispatcher import dispatch_prompts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=40)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = start_fake_openai_server(latency=args.latency)
+    client = OpenAI(api_key='fake', base_url=f"http://127.0.0.1:{server.server_port}/v1")
+
+    def send(prompt, timeout=None):
+        completion = client.chat.completions.create(
+            model='gpt-4o-mini',
+            messages=[{'role': 'user', 'content': prompt}],
+            timeout=timeout,
+        )
+        return completion.choices[0].message.content
+
+    prompts = [f"chunk {i}" for i in range(args.chunks)]
+    print(f"{args.chunks} chunks, {args.latency:.2f}s simulated latency per call")
+    baseline = None
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        results = dispatch_prompts(prompts, send, max_concurrency=concurrency, timeout=30)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        failed = sum(result is None for result in results)
+        print(f"concurrency={concurrency:>3}  {elapsed:6.2f}s  speedup x{baseline / elapsed:4.1f}  failed={failed}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
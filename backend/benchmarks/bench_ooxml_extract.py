@@ -0,0 +1,105 @@
+"""
+Benchmark for the lxml DOCX/PPTX extractors in file_upload_app.file_extractors against
+the old python-docx/python-pptx object-model extractors.
+
+Each extractor runs in a fresh process (see benchmarks.isolated).
+Without --docx/--pptx, synthetic documents are generated first (--paragraphs, --slides).
+
+Run from the backend directory:  python -m benchmarks.bench_ooxml_extract --paragraphs 20000 --slides 300
+"""
+import argparse
+import os
+import tempfile
+from docx import Document
+from pptx import Presentation
+from pptx.util import Inches
+from benchmarks.isolated import run_isolated
+from file_upload_app.file_extractors import extract_text_from_file
+
+SENTENCE = 'Entreprenøren skal sortere minst 90 % av avfallet og dokumentere leveranser til godkjent mottak.'
+
+
+def write_synthetic_docx(path, paragraphs):
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = 'Miljøoppfølgingsplan'
+    for i in range(paragraphs):
+        if i % 100 == 0:
+            document.add_heading(f'Kapittel {i // 100 + 1}', 1)
+            table = document.add_table(rows=5, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = 'Krav 4.2 – dokumentert'
+        document.add_paragraph(f'{i + 1}. {SENTENCE}')
+    document.save(path)
+
+
+def write_synthetic_pptx(path, slides):
+    presentation = Presentation()
+    for i in range(slides):
+        slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+        slide.shapes.title.text = f'Lysbilde {i + 1}'
+        slide.placeholders[1].text = '\n'.join([SENTENCE] * 5)
+        if i % 10 == 0:
+            table = slide.shapes.add_table(4, 3, Inches(1), Inches(4), Inches(6), Inches(2)).table
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = 'Tiltak'
+    presentation.save(path)
+
+
+def old_docx_text(file_path):
+    doc = Document(file_path)
+    return '\n'.join([paragraph.text for paragraph in doc.paragraphs])
+
+
+def old_pptx_text(file_path):
+    prs = Presentation(file_path)
+    text = []
+    for slide in prs.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                text.append(shape.text)
+    return '\n'.join(text)
+
+
+EXTRACTORS = {
+    'docx': {'python-docx': old_docx_text, 'lxml iterparse': extract_text_from_file},
+    'pptx': {'python-pptx': old_pptx_text, 'lxml iterparse': extract_text_from_file},
+}
+
+
+def count_characters(kind, name, path):
+    return len(EXTRACTORS[kind][name](path))
+
+
+def run(kind, name, path):
+    characters, elapsed, baseline_mb, peak_mb = run_isolated(count_characters, kind, name, path)
+    print(f"{kind} {name:<16} {elapsed:7.2f} s  peak RSS {peak_mb:7.1f} MB (+{peak_mb - baseline_mb:.1f} MB)  "
+          f"{characters} characters")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docx', help='DOCX file to extract.')
+    parser.add_argument('--pptx', help='PPTX file to extract.')
+    parser.add_argument('--paragraphs', type=int, default=20000, help='Paragraphs in the synthetic DOCX.')
+    parser.add_argument('--slides', type=int, default=300, help='Slides in the synthetic PPTX.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = {'docx': args.docx, 'pptx': args.pptx}
+        if not paths['docx']:
+            paths['docx'] = os.path.join(temp_dir, 'synthetic.docx')
+            write_synthetic_docx(paths['docx'], args.paragraphs)
+        if not paths['pptx']:
+            paths['pptx'] = os.path.join(temp_dir, 'synthetic.pptx')
+            write_synthetic_pptx(paths['pptx'], args.slides)
+
+        for kind, path in paths.items():
+            print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            for name in EXTRACTORS[kind]:
+                run(kind, name, path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark for the PDF extractors in file_upload_app.file_extractors (pdfium vs PyPDF2).
+
+Each extractor runs in a fresh process (see benchmarks.isolated),
+then pdfium runs again split into page ranges over --workers processes (peak RSS is that
+of the parent process). Without --pdf, a synthetic text PDF of --pages pages is generated first.
+
+Run from the backend directory:  python -m benchmarks.bench_pdf_extract --pages 1000 --workers 4
+                                 python -m benchmarks.bench_pdf_extract --pdf big_report.pdf
+"""
+import argparse
+import os
+import tempfile
+from benchmarks.isolated import run_isolated
+from file_upload_app.file_extractors import PDF_EXTRACTORS, extract_pdf_pages, iter_pdf_pages
+
+LINE = 'Miljøoppfølgingsplanen beskriver tiltak for avfallssortering, støvdemping og massehåndtering.'
+
+
+def write_synthetic_pdf(path, pages, lines_per_page=45):
+    """
+    Writes a plain PDF with `pages` pages of Helvetica text, without any PDF library.
+    """
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # the page tree, written once the pages are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for page in range(pages):
+        text = ''.join(
+            f"({f'Side {page + 1} linje {line + 1}: {LINE}'}) Tj T* " for line in range(lines_per_page)
+        )
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_id
+        )
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), pages)
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+
+
+def extract(extractor, path, workers):
+    pages = 0
+    characters = 0
+    if workers > 1:
+        records = extract_pdf_pages(path, extractor, workers=workers, min_pages=1)
+    else:
+        records = iter_pdf_pages(path, extractor)
+    for _, text in records:
+        pages += 1
+        characters += len(text)
+    return pages, characters
+
+
+def run(extractor, path, workers=1):
+    (pages, characters), elapsed, _, peak_mb = run_isolated(extract, extractor, path, workers)
+    print(f"{extractor + (f' x{workers}' if workers > 1 else ''):<12} {pages / elapsed:8.1f} pages/s  {elapsed:7.2f} s  peak RSS {peak_mb:7.1f} MB  "
+          f"{pages} pages  {characters} characters")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pdf', action='append', help='PDF file to extract (repeatable).')
+    parser.add_argument('--pages', type=int, default=1000, help='Pages in the synthetic PDF.')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes for the page-range run.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = args.pdf
+        if not paths:
+            paths = [os.path.join(temp_dir, f'synthetic-{args.pages}.pdf')]
+            write_synthetic_pdf(paths[0], args.pages)
+
+        for path in paths:
+            print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            for extractor in PDF_EXTRACTORS:
+                run(extractor, path)
+            if args.workers > 1:
+                run('pdfium', path, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark for the streaming XLSX extractor in file_upload_app.file_extractors against
+the old full-mode load_workbook path.
+
+Each extractor runs in a fresh process (see benchmarks.isolated).
+Without --xlsx, a synthetic quantity/waste-tracking workbook of --rows rows is generated first.
+
+Run from the backend directory:  python -m benchmarks.bench_xlsx_extract --rows 200000
+"""
+import argparse
+import os
+import tempfile
+from openpyxl import Workbook, load_workbook
+from benchmarks.isolated import run_isolated
+from file_upload_app.file_extractors import iter_xlsx_rows
+
+HEADER = ['Dato', 'Avfallstype', 'Fraksjon', 'Mengde (tonn)', 'Mottak', 'Sorteringsgrad (%)', 'Kommentar']
+
+
+def write_synthetic_xlsx(path, rows, sheets=2):
+    workbook = Workbook(write_only=True)
+    for sheet_index in range(sheets):
+        sheet = workbook.create_sheet(f'Avfall {sheet_index + 1}')
+        sheet.append(HEADER)
+        for row in range(rows // sheets):
+            sheet.append([
+                f'2024-{row % 12 + 1:02d}-{row % 28 + 1:02d}', 'Betong', f'{1000 + row % 50}',
+                round(row * 0.37 % 90, 2), 'Mottak Nord', 80 + row % 20, 'Levert til godkjent mottak',
+            ])
+    workbook.save(path)
+
+
+def old_xlsx_rows(file_path):
+    workbook = load_workbook(filename=file_path)
+    for sheet in workbook:
+        for row in sheet.iter_rows(values_only=True):
+            yield ' '.join([str(cell) for cell in row if cell is not None])
+
+
+def new_xlsx_rows(file_path):
+    for _, _, values in iter_xlsx_rows(file_path):
+        yield ' '.join(values)
+
+
+EXTRACTORS = {
+    'full load_workbook': old_xlsx_rows,
+    'read-only stream': new_xlsx_rows,
+}
+
+
+def count_rows(name, path):
+    return sum(1 for _ in EXTRACTORS[name](path))
+
+
+def run(name, path):
+    rows, elapsed, _, peak_mb = run_isolated(count_rows, name, path)
+    print(f"{name:<20} {rows / elapsed:9.0f} rows/s  {elapsed:7.2f} s  peak RSS {peak_mb:7.1f} MB  {rows} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--xlsx', action='append', help='XLSX file to extract (repeatable).')
+    parser.add_argument('--rows', type=int, default=200000, help='Rows in the synthetic workbook.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = args.xlsx
+        if not paths:
+            paths = [os.path.join(temp_dir, f'synthetic-{args.rows}.xlsx')]
+            write_synthetic_xlsx(paths[0], args.rows)
+
+        for path in paths:
+            print(f"{os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB)")
+            for name in EXTRACTORS:
+                run(name, path)
+
+
+if __name__ == '__main__':
+    main()
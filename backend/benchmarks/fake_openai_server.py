@@ -0,0 +1,97 @@
+"""
+Minimal OpenAI-compatible chat completions server for local benchmarks.
+
+Every POST to /v1/chat/completions sleeps for `latency` seconds and answers with a
+short completion, so the cost of the OpenAI round-trip can be simulated without
+network access or API spend. Prompt caching is imitated too: the usage reports as
+cached the longest prefix (in 128-token steps, from 1024 tokens) shared with an earlier
+request, at 4 characters per token. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Run standalone:  python -m benchmarks.fake_openai_server --port 8808 --latency 0.5
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _cached_tokens(text, seen):
+    longest = max((len(os.path.commonprefix([text, earlier])) for earlier in seen), default=0)
+    tokens = longest // 4
+    return tokens // 128 * 128 if tokens >= 1024 else 0
+
+
+def make_handler(latency, reply):
+    seen = []
+    seen_lock = threading.Lock()
+
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        requests_served = 0
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            time.sleep(latency)
+
+            prompt = body.get('messages', [{}])[-1].get('content', '')
+            content = reply(prompt) if callable(reply) else reply
+            text = '\n'.join(message.get('content', '') for message in body.get('messages', []))
+            with seen_lock:
+                cached_tokens = _cached_tokens(text, seen)
+                seen.append(text)
+            payload = json.dumps({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'fake'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop',
+                }],
+                'usage': {
+                    'prompt_tokens': len(text) // 4,
+                    'completion_tokens': len(content) // 4,
+                    'total_tokens': (len(text) + len(content)) // 4,
+                    'prompt_tokens_details': {'cached_tokens': cached_tokens},
+                },
+            }).encode('utf-8')
+            FakeOpenAIHandler.requests_served += 1
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeOpenAIHandler
+
+
+def start_fake_openai_server(port=0, latency=0.5, reply='OK'):
+    """
+    Starts the server in a background thread and returns it. The base URL for the
+    OpenAI client is f"http://127.0.0.1:{server.server_port}/v1".
+    `reply` is a string or a callable taking the prompt and returning the answer.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(latency, reply))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--latency', type=float, default=0.5)
+    args = parser.parse_args()
+    server = start_fake_openai_server(args.port, args.latency)
+    print(f"Fake OpenAI server listening on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
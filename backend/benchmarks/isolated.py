@@ -0,0 +1,36 @@
+"""
+Runs a benchmark measurement in a fresh process, so its peak RSS is not hidden by an
+earlier run in the same process.
+"""
+import multiprocessing
+import resource
+import time
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(function, args, results):
+    # The baseline is what the imports already use
+    baseline_mb = _peak_rss_mb()
+    start = time.perf_counter()
+    value = function(*args)
+    elapsed = time.perf_counter() - start
+    results.put((value, elapsed, baseline_mb, _peak_rss_mb()))
+
+
+def run_isolated(function, *args):
+    """
+    Calls `function(*args)` in a new spawned process and returns (its return value,
+    seconds, peak RSS in MB before the call, peak RSS in MB after it). `function` must be
+    defined at module level and return something picklable.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_measure, args=(function, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
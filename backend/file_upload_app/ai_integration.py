@@ -1,10 +1,19 @@
 from openai import OpenAI
 import os
-import requests
 import re
 import json
+import threading
+import time
 from dotenv import load_dotenv
-from .file_extractors import extract_text_from_file
+from django.conf import settings
+from functools import partial
+from .chunker import count_tokens
+from .file_extractors import extract_files
+from .llm_cache import cache_key, get_cached_responses, store_responses
+from .llm_dispatcher import dispatch_prompts
+from .prompt_layout import SYSTEM_PROMPT, build_messages, criteria_context
+from .prompt_packing import final_max_tokens, pack_prompt
+from .retrieval import criteria_query
 
 # Load OpenAI API key from environment
 load_dotenv()
@@ -21,183 +30,255 @@ def print_formatted(message, is_prompt=True):
     else:
         print(f"\n{separator}\nAI RESPONSE:\n{separator}\n{message}\n{separator}")
 
-# Function to send a prompt to OpenAI
-def generate_summary_for_file(prompt):
+OPENAI_MODEL = "gpt-4o-mini"  # You can use "gpt-4-32k" or other available models
+
+# Token usage of the OpenAI requests made by this process since it started
+_usage = {'requests': 0, 'request_seconds': 0.0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+_usage_lock = threading.Lock()
+
+
+def _record_usage(usage, seconds):
+    details = getattr(usage, 'prompt_tokens_details', None) if usage else None
+    with _usage_lock:
+        _usage['requests'] += 1
+        _usage['request_seconds'] += seconds
+        if usage:
+            _usage['prompt_tokens'] += usage.prompt_tokens or 0
+            _usage['completion_tokens'] += usage.completion_tokens or 0
+            # Prompt tokens served from the provider's prompt cache (see prompt_layout)
+            _usage['cached_tokens'] += (details.cached_tokens or 0) if details else 0
+
+
+def usage_stats():
+    """
+    Returns the OpenAI request count, time and token usage of this process, e.g.
+    {'requests': 12, 'request_seconds': 30.5, 'prompt_tokens': 40000, 'cached_tokens': 28000, ...}.
     """
-    Function to interact with OpenAI API using a given prompt.
+    with _usage_lock:
+        return dict(_usage)
+
+def _request_completion(prompt, timeout=None, max_tokens=1500):
+    """
+    Sends one prompt to the API, uncached, and returns the response and its finish_reason
+    ('length' if it was cut off at max_tokens).
     """
-    print_formatted(prompt)  # Print the prompt being sent
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else prompt
+    print_formatted('\n\n'.join(message['content'] for message in messages))  # Print the prompt being sent
+    started = time.monotonic()
     completion = client.chat.completions.create(
-        model="gpt-4o-mini",  # You can use "gpt-4-32k" or other available models
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=1500  # Adjust based on chunk size
+        model=OPENAI_MODEL,
+        messages=messages,
+        max_tokens=max_tokens,
+        timeout=timeout or settings.LLM_REQUEST_TIMEOUT,
     )
+    _record_usage(completion.usage, time.monotonic() - started)
     response = completion.choices[0].message.content
+    finish_reason = completion.choices[0].finish_reason
     print_formatted(response, is_prompt=False)  # Print the AI's response
-    return response
+    if finish_reason == 'length':
+        print(f"Response cut off at max_tokens={max_tokens}")
+    return response, finish_reason
 
-# Step 1: Fetch audit criteria data from the API
-def fetch_audit_criteria_data():
+# Function to send a prompt to OpenAI
+def generate_summary_for_file(prompt, timeout=None, max_tokens=1500, use_cache=True):
     """
-    Fetches the audit criteria data from the API endpoint.
+    Function to interact with OpenAI API using a given prompt: a user message, or a list of chat
+    messages (see prompt_layout.build_messages).
+    `timeout` (seconds) bounds this single request; defaults to LLM_REQUEST_TIMEOUT.
+    Responses are cached by model, parameters and prompt; pass use_cache=False to always call the API.
+    Responses cut off at max_tokens are not cached, so the next run asks again.
     """
-    response = requests.get("http://backend:8000/api/process-criteria-data/")
-
-    if response.status_code == 200:
-        return response.json()['data']
-    else:
-        print(f"Failed to fetch criteria data. Status code: {response.status_code}")
-        return None
+    if use_cache:
+        key = cache_key(OPENAI_MODEL, {'max_tokens': max_tokens}, prompt)
+        cached = get_cached_responses([key])
+        if key in cached:
+            return cached[key]
+
+    response, finish_reason = _request_completion(prompt, timeout=timeout, max_tokens=max_tokens)
+    if use_cache and response and finish_reason != 'length':
+        store_responses(OPENAI_MODEL, {key: response})
+    return response
 
-# Step 2: Send criteria data to OpenAI to set context
-def initialize_audit_criteria(criteria_data):
+def generate_summaries(prompts, max_tokens=1500, on_result=None, use_cache=True):
     """
-    Sends the audit criteria data to OpenAI as context before processing files.
+    Sends many prompts concurrently (see llm_dispatcher) and returns the responses in order,
+    with None for calls that failed. Cached responses are looked up and stored in one
+    query each from the calling thread, and only cache misses are sent to the API.
+    Responses cut off at max_tokens are returned but not cached.
+    `on_result(done, total, index)` is called for every prompt, cached or not.
     """
-    prompt = f"""
-    Here is the relevant audit criteria data:
-    - Category: {criteria_data['category']['category_name']} ({criteria_data['category']['category_number']})
-      Summary: {criteria_data['category']['category_summary']}
-    - Assessment Issue: {criteria_data['assessment_issue']['issue_name']} ({criteria_data['assessment_issue']['issue_number']})
-      Aim: {criteria_data['assessment_issue']['aim']}
-    - Assessment Criteria: {criteria_data['assessment_criteria']['name']}
-      Description: {criteria_data['assessment_criteria']['description']}
-    - Credits: {criteria_data['credits']}
-    - Guidance: {', '.join(criteria_data['guidances'])}
-    - Evidence: {', '.join([e['evidence_guidance'] for e in criteria_data['evidences']])}
-
-    Please remember this information as context for reviewing the documentation files.
-    """
-    generate_summary_for_file(prompt)
-    print("Audit Criteria Context Sent.")
+    results = [None] * len(prompts)
+    keys = [cache_key(OPENAI_MODEL, {'max_tokens': max_tokens}, prompt) for prompt in prompts]
+    cached = get_cached_responses(keys) if use_cache else {}
+
+    done = 0
+    pending = []
+    for index, key in enumerate(keys):
+        if key in cached:
+            results[index] = cached[key]
+            done += 1
+            if on_result:
+                on_result(done, len(prompts), index)
+        else:
+            pending.append(index)
+
+    def report(pending_done, pending_total, pending_index):
+        if on_result:
+            on_result(done + pending_done, len(prompts), pending[pending_index])
+
+    completions = dispatch_prompts(
+        [prompts[index] for index in pending],
+        partial(_request_completion, max_tokens=max_tokens),
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        timeout=settings.LLM_REQUEST_TIMEOUT,
+        on_result=report,
+    )
 
-# Step 3: Chunk a document into smaller pieces
-def chunk_text(text, chunk_size=3000):
-    """
-    Breaks the text into manageable chunks based on the token limit.
-    """
-    words = text.split()
-    chunks = [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
-    return chunks
+    fresh = {}
+    for index, completion in zip(pending, completions):
+        if completion is None:
+            continue
+        response, finish_reason = completion
+        results[index] = response
+        if response and finish_reason != 'length':
+            fresh[keys[index]] = response
+    if use_cache:
+        store_responses(OPENAI_MODEL, fresh)
+    return results
 
 # Step 4: Process files in the directory
-def process_files_in_directory(directory):
+def process_files_in_directory(directory, on_progress=None, file_hashes=None):
     """
-    Process all files in the given directory, extracting text and chunking them.
+    Process all files in the given directory, extracting text and chunking them in parallel
+    (see file_extractors.extract_files). Files come back sorted by name, each as
+    {'file_name', 'document', 'chunks'} with chunks as offsets into the document's text.
+    `file_hashes` maps file names to the SHA-256 recorded at upload, used to reuse earlier extractions.
+    `on_progress(current, total, detail)` is called as each file finishes.
     """
-    file_summaries = []
+    def report(done, total, file_name):
+        if on_progress:
+            on_progress(done, total, f"file {done}/{total}: {file_name}")
 
-    for file_name in os.listdir(directory):
-        file_path = os.path.join(directory, file_name)
-        try:
-            file_text = extract_text_from_file(file_path)
-            chunks = chunk_text(file_text)
-            file_summaries.append({'file_name': file_name, 'chunks': chunks})
-        except Exception as e:
-            print(f"Error extracting text from {file_name}: {e}")
+    file_summaries = []
+    for result in extract_files(directory, file_hashes, on_result=report):
+        if 'error' in result:
+            print(f"Error extracting text from {result['file_name']}: {result['error']}")
+        else:
+            print(f"Normalized {result['file_name']}: {result['stats']}")
+            file_summaries.append(result)
 
     return file_summaries
 
-# Step 5: Send file chunks to OpenAI
-def send_file_chunks(file_summaries):
-    """
-    Sends chunks of each document one by one, telling the AI to remember them.
-    """
-    for file_summary in file_summaries:
-        file_name = file_summary['file_name']
-        chunks = file_summary['chunks']
-
-        for i, chunk in enumerate(chunks):
-            prompt = f"""
-            You are reviewing a document named '{file_name}'.
-
-            Here is chunk {i + 1} of this document. This is a section of the document text:
-
-            {chunk}
-
-            Please remember this information for later when generating the final response based on the provided audit criteria.
-            """
-            generate_summary_for_file(prompt)
-            print(f"Chunk {i + 1} of {file_name} sent.")
-
 # Step 6: Final prompt to generate summaries, descriptions, and points
-def finalize_summaries(total_points, file_summaries, criteria_data):
+def finalize_summaries(total_points, file_summaries, criteria_data, evidence_notes, on_metrics=None):
     """
     Sends the final prompt to generate summaries, descriptions, and calculate points based on the provided JSON data.
+    `evidence_notes` are the map-reduced notes, with source references, extracted from the documents.
     All content must be in Norwegian, and points should be formatted as "X av Y".
-    """
 
-    # Build the prompt with a recap of what was sent
-    final_prompt = "Du har tidligere mottatt deler av følgende dokumenter. Vennligst husk innholdet og lag følgende basert på konteksten som er gitt nedenfor, og i norsk språk:\n\n"
-
-    for i, file_summary in enumerate(file_summaries, 1):
-        file_name = file_summary['file_name']
-        final_prompt += f"- Dokument {i}: {file_name}\n"
-
-    # Re-state the audit criteria data (e.g., credits, guidance, and evidence)
-    final_prompt += f"""
-    Her er relevant revisjonskriteriedata for referanse:
-    - Kategori: {criteria_data['category']['category_name']} ({criteria_data['category']['category_number']})
-      Sammendrag: {criteria_data['category']['category_summary']}
-    - Revisjonsspørsmål: {criteria_data['assessment_issue']['issue_name']} ({criteria_data['assessment_issue']['issue_number']})
-      Mål: {criteria_data['assessment_issue']['aim']}
-    - Vurderingskriterium: {criteria_data['assessment_criteria']['name']}
-      Beskrivelse: {criteria_data['assessment_criteria']['description']}
-    - Veiledning: {', '.join(criteria_data['guidances'])}
-    - Bevis: {', '.join([e['evidence_guidance'] for e in criteria_data['evidences']])}
-    - Poeng:
+    The prompt is laid out by prompt_layout (criteria and instructions before the task's documents and notes) and
+    packed into FINAL_PROMPT_TOKEN_BUDGET tokens (see prompt_packing): evidence notes that do not fit are dropped,
+    least relevant first, and max_tokens is sized to the number of documents.
+    `on_metrics(**metrics)` receives the prompt's token counts and what was dropped.
+    Raises InvalidResponseError if the answer was cut off at max_tokens or is not valid JSON.
     """
 
-    # Loop through credits and add them to the prompt
-    for credit in criteria_data['credits']:
-        final_prompt += f"  - {credit['assessment_stage']}: {credit['credits_value']} (Delpoeng: {credit.get('sub_credit_value', 'N/A')})\n"
-
     # Add instructions for summaries, descriptions, and points calculation in JSON format
     #Samsvarsbeskrivelsen må bevise hvilke tiltak som har blitt gjort for å bestå revisjonskriteriet. Må peke på side
     #Formålet med prosjekt er å gjøre at miljøarbeidere unngår å gå gjennom dokumentet for å finne bevis på hvordan revisjonskriteriet ble møtt. Det må være kildehenvisning, det krever revisor. Bevisene må pekes hvor de ligger.
     #Den skal basert på kravene i manualen, beskrive tiltak som har blitt gjort og peke på bevise med kildehenvisning og dokument.
     # Send mail med ønsker og hva du trenger for å gjøre modellen bedre og teste frem og tilbake for å produsere noe som er nesten identisk til svarene du allerede har.
-    final_prompt += f"""
-    Basert på disse dokumentene og de gitte revisjonskriteriene, bruk bare informasjon og data som du har blitt gitt, og generer følgende på norsk i JSON-format:
-    
-    1. Basert på kravene i relevant revisjonskriteriedata, beskriv tiltak som har blitt gjort (110-350 tegn), og pek på bevis med kildehenvisning med sidetall og dokument.
-        Her er noen eksempler. Ikke kopier, ta det som inspirasjon:
-        - Visuell påvirkning i anleggsfasen er inkludert i prosjektets miljøplan (Miljørisikovurdering og Miljøplan SUN01) kapittel 1.3.2, som tar for seg viktigheten av avfallssortering, system for lagring av masser og materialer, i tillegg til generell opprydning etter arbeid. 
-        - Bane NOR har månedlige kampanje med ulike tema, hvor mai 2023 hadde tema orden og ryddighet. Kampanjene distribueres internt hos Bane NOR og videreføres til entreprenørene. Kampanjen beskriver hvordan materialer og utstyr skal lagres langs jernbanen, støvdempende tiltak, god merking for kildesortering, generell orden og ryddighet (Orden og ryddighet mai 2023). 
-    2. En unik beskrivelse for hvert dokument (30-110 tegn), basert på spesifikt innhold i dokumentet.
-    3. Beregn opptjente poeng ut av totalt {total_points} for hele prosjektet. Poengene skal reflektere hvor godt dokumentene oppfyller poengene, veiledningen, og bevisene som er gitt ovenfor.
-
-    Svaret skal følge dette formatet:
-
-    {{
-        "compliance_description": [
-            {{
-                "document_number": "01",
-                "summary": "Bærekraftige prinsipper og klima- og miljømål for prosjektet er satt av Byggherre i dokument D4.6 under avsnitt 2 og 3.1 – 3.9."
-            }},
-            {{
-                "document_number": "02",
-                "summary": "Spesifikke klima og miljømål og krav for prosjektet er beskrevet i Byggherrens MOP (miljøoppfølgingsplan), UVB-03-A-10408_02B, under avsnitt 4.1-4.5."
-            }}
-        ],
-        "attachments": [
-            {{
-                "number": "01",
-                "name": "D4.6 Spesialle krav til Klima og miljø",
-                "description": "Byggherrens overordnede klima og miljømål for utbyggingen."
-            }},
-            {{
-                "number": "02",
-                "name": "UVB-03-A-10408_02B",
-                "description": "Byggherrens MOP (Miljøoppfølgingsplan)."
-            }}
-        ],
-        "total_points": X av {total_points}"
-    }}
-    """
+    # Only depends on the criteria, so it is part of the prefix shared by every final prompt for the criteria
+    instructions = f"""Oppgave: basert på dokumentene og bevisnotatene nedenfor og revisjonskriteriedataene over, bruk bare informasjon og data som du har blitt gitt, og generer følgende på norsk i JSON-format:
+
+1. Basert på kravene i revisjonskriteriedataene, beskriv tiltak som har blitt gjort (110-350 tegn) for hvert dokument, og pek på bevis med kildehenvisning med sidetall og dokument, som i eksemplene.
+2. En unik beskrivelse for hvert dokument (30-110 tegn), basert på spesifikt innhold i dokumentet.
+3. Beregn opptjente poeng ut av totalt {total_points} for hele prosjektet. Poengene skal reflektere hvor godt dokumentene oppfyller poengene, veiledningen, og bevisene som er gitt ovenfor.
+
+Svaret skal følge dette formatet:
+
+{{
+    "compliance_description": [
+        {{
+            "document_number": "01",
+            "summary": "Bærekraftige prinsipper og klima- og miljømål for prosjektet er satt av Byggherre i dokument D4.6 under avsnitt 2 og 3.1 – 3.9."
+        }},
+        {{
+            "document_number": "02",
+            "summary": "Spesifikke klima og miljømål og krav for prosjektet er beskrevet i Byggherrens MOP (miljøoppfølgingsplan), UVB-03-A-10408_02B, under avsnitt 4.1-4.5."
+        }}
+    ],
+    "attachments": [
+        {{
+            "number": "01",
+            "name": "D4.6 Spesialle krav til Klima og miljø",
+            "description": "Byggherrens overordnede klima og miljømål for utbyggingen."
+        }},
+        {{
+            "number": "02",
+            "name": "UVB-03-A-10408_02B",
+            "description": "Byggherrens MOP (Miljøoppfølgingsplan)."
+        }}
+    ],
+    "total_points": "X av {total_points}"
+}}"""
+
+    # The task's own content goes last: the documents and the evidence found in them
+    documents_section = "Følgende dokumenter er gjennomgått:\n"
 
-    # Send the final prompt to the AI
-    response = generate_summary_for_file(final_prompt)
+    for i, file_summary in enumerate(file_summaries, 1):
+        file_name = file_summary['file_name']
+        documents_section += f"- Dokument {i}: {file_name}\n"
+
+    evidence_section = "\nBevisnotater hentet fra dokumentene, med kildehenvisning i hakeparentes:\n"
+    # One line per note, so the least relevant notes can be dropped if the prompt gets too long
+    notes = [line for line in (evidence_notes or '').splitlines() if line.strip()]
+    if not notes:
+        evidence_section += "(Ingen relevante bevis funnet i dokumentene.)\n"
+
+    # Leave room for the answer: a summary and a description per document
+    max_tokens = final_max_tokens(len(file_summaries))
+    prefix_tokens = {
+        'system': count_tokens(SYSTEM_PROMPT),
+        'criteria': count_tokens(criteria_context(criteria_data)),
+        'instructions': count_tokens(instructions),
+    }
+    budget = min(settings.FINAL_PROMPT_TOKEN_BUDGET, settings.LLM_CONTEXT_TOKENS - max_tokens)
+    content, section_tokens, dropped = pack_prompt([
+        ('documents', documents_section),
+        ('evidence', evidence_section),
+        ('evidence_notes', notes),
+    ], budget - sum(prefix_tokens.values()), criteria_query(criteria_data))
+
+    dropped_notes = dropped['evidence_notes']
+    if dropped_notes:
+        print(f"Dropped {len(dropped_notes)} of {len(notes)} evidence notes to fit the final prompt in {budget} tokens:")
+        for note in dropped_notes:
+            print(f"  {note}")
+    if on_metrics:
+        on_metrics(
+            final_prompt_tokens={**prefix_tokens, **section_tokens},
+            final_max_tokens=max_tokens,
+            final_dropped_notes=len(dropped_notes),
+        )
+
+    # Send the final prompt to the AI; a cut-off answer is incomplete JSON, so fail with the real cause
+    messages = build_messages(criteria_data, instructions, content)
+    key = cache_key(OPENAI_MODEL, {'max_tokens': max_tokens}, messages)
+    cached = get_cached_responses([key])
+    if key in cached:
+        try:
+            parse_json_response(cached[key])
+            return cached[key]
+        except InvalidResponseError:
+            # Cached before answers were checked; ask again and replace it
+            pass
+    response, finish_reason = _request_completion(messages, max_tokens=max_tokens)
+    if finish_reason == 'length':
+        raise InvalidResponseError(f"The AI model's answer was cut off at max_tokens={max_tokens}")
+    # Only an answer that parses is cached, so resubmitting the task asks again instead of failing the same way
+    parse_json_response(response)
+    store_responses(OPENAI_MODEL, {key: response})
 
     return response
 
@@ -221,46 +302,64 @@ def calculate_total_points(criteria_data):
 
     return total_points
 
-def save_response_as_json(response, file_path):
-    try:
-        # Check for triple backticks and remove them
-        if response.startswith("```json") and response.endswith("```"):
-            # Strip the triple backticks and any newlines or spaces around the JSON data
-            cleaned_response = response[7:-3].strip()
-        else:
-            cleaned_response = response.strip()
-
-        # Convert the cleaned string to a JSON object
-        response_data = json.loads(cleaned_response)
+class InvalidResponseError(Exception):
+    """
+    The final answer cannot be used: it was cut off at max_tokens or is not valid JSON.
+    """
 
-        # Write JSON data to a file
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(response_data, file, indent=4)
-        print(f"JSON data saved to {file_path}")
+def parse_json_response(response):
+    """
+    Parses the model's JSON answer, with or without a ```json fence around it.
+    Raises InvalidResponseError if it is empty or not valid JSON.
+    """
+    if not response:
+        raise InvalidResponseError("The AI model returned an empty answer")
+    # Check for triple backticks and remove them
+    if response.startswith("```json") and response.endswith("```"):
+        # Strip the triple backticks and any newlines or spaces around the JSON data
+        cleaned_response = response[7:-3].strip()
+    else:
+        cleaned_response = response.strip()
+    try:
+        return json.loads(cleaned_response)
     except json.JSONDecodeError as e:
-        print(f"Failed to decode response as JSON. Error: {e}")
-    except Exception as e:
-        print(f"An error occurred while saving the JSON data: {e}")
+        raise InvalidResponseError(f"The AI model's answer is not valid JSON ({e})") from e
+
+def save_response_as_json(response, file_path):
+    """
+    Writes the model's JSON answer to `file_path`. Raises InvalidResponseError if it does
+    not parse, so the task fails with that cause instead of a missing file later on.
+    """
+    response_data = parse_json_response(response)
+    with open(file_path, 'w', encoding='utf-8') as file:
+        json.dump(response_data, file, indent=4)
+    print(f"JSON data saved to {file_path}")
 
 # Main execution flow
 if __name__ == "__main__":
-    # Path to the directory containing files
-    directory = os.path.join(os.path.dirname(__file__), '..', 'media', 'uploads')
+    import sys
+    from .criteria_context import get_criteria_context
+
+    # Path to the directory containing the task's files
+    task_id, criteria_id = sys.argv[1], sys.argv[2]
+    directory = os.path.join(os.path.dirname(__file__), '..', 'media', 'tasks', task_id, 'uploads')
 
-    # Step 1: Fetch audit criteria data from the API
-    criteria_data = fetch_audit_criteria_data()
+    # Step 1: Fetch audit criteria data
+    criteria_data = get_criteria_context(criteria_id)
 
     if not criteria_data:
         print("No criteria data found.")
     else:
-        initialize_audit_criteria(criteria_data)
+        from .retrieval import retrieve_chunks
+        from .summarization import map_chunks, reduce_notes
 
         file_summaries = process_files_in_directory(directory)
 
-        send_file_chunks(file_summaries)
+        notes = map_chunks(file_summaries, criteria_data, chunk_ids=retrieve_chunks(file_summaries, criteria_data))
+        evidence_notes = reduce_notes(notes, criteria_data, settings.EVIDENCE_TOKEN_BUDGET)
 
         total_points = calculate_total_points(criteria_data)
-        final_response = finalize_summaries(total_points, file_summaries, criteria_data)
+        final_response = finalize_summaries(total_points, file_summaries, criteria_data, evidence_notes)
 
         print("Final response content for debugging:", final_response)  # Debugging print
         save_response_as_json(final_response, 'final_output.json')
@@ -0,0 +1,223 @@
+import re
+from collections import deque
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Encoding used by gpt-4o / gpt-4o-mini
+TOKENIZER_ENCODING = 'o200k_base'
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?:;])\s+')
+_WORD_BREAK = re.compile(r'\s+')
+_TOKEN_PIECES = re.compile(r'[^\W\d_]+|\d+|[^\w\s]|_')
+
+_encoding = None
+_encoding_loaded = False
+
+
+def get_encoding():
+    """
+    Returns the tiktoken encoding, or None when tiktoken or its BPE file is not available
+    (the file is downloaded on first use unless TIKTOKEN_CACHE_DIR already holds it).
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                print(f"Tokenizer {TOKENIZER_ENCODING} unavailable, estimating token counts instead: {e}")
+    return _encoding
+
+
+def estimate_tokens(text):
+    """
+    Estimates the token count without a tokenizer. Letters count as one token per four
+    characters (so long Norwegian compounds cost more than short words), digits as one
+    per three, and every punctuation mark as one. This errs on the high side for
+    Norwegian technical text, so chunks stay within their budget.
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        elif piece[0].isalpha():
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def count_tokens(text):
+    """
+    Counts the tokens in `text` with the model's tokenizer, or estimates them when it is unavailable.
+    """
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def _split_on(pattern, text, start, end):
+    """
+    Yields the (start, end) offsets of the pieces of text[start:end] between matches of `pattern`.
+    """
+    for match in pattern.finditer(text, start, end):
+        yield start, match.start()
+        start = match.end()
+    yield start, end
+
+
+def _strip(text, start, end):
+    # Offsets of text[start:end] without its surrounding whitespace
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_run(text, start, end, max_tokens):
+    """
+    Yields (start, end, tokens) pieces of text[start:end], a run without whitespace (URLs,
+    base64, OCR noise), of at most `max_tokens` tokens each: the longest prefix that fits,
+    then the rest the same way.
+    """
+    # First guess at a piece's length: four characters per token, as in estimate_tokens
+    size = max_tokens * 4
+    while start < end:
+        # Grow from the previous piece's length until the prefix no longer fits, then bisect
+        low, high = start + 1, min(end, start + size)
+        while high < end and count_tokens(text[start:high]) <= max_tokens:
+            low, high = high, min(end, start + 2 * (high - start))
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(text[start:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        yield start, low, count_tokens(text[start:low])
+        size = low - start
+        start = low
+
+
+def _iter_units(text, paragraphs, max_tokens):
+    """
+    Yields (start, end, tokens) units of `text` no larger than `max_tokens`: whole paragraphs
+    (given as (start, end) offsets) where they fit, otherwise sentences, otherwise runs of
+    words, and words that are too long on their own are cut.
+    """
+    for paragraph_start, paragraph_end in paragraphs:
+        paragraph_start, paragraph_end = _strip(text, paragraph_start, paragraph_end)
+        if paragraph_start == paragraph_end:
+            continue
+        # The paragraph break costs about one token
+        tokens = count_tokens(text[paragraph_start:paragraph_end]) + 1
+        if tokens <= max_tokens:
+            yield paragraph_start, paragraph_end, tokens
+            continue
+
+        for sentence_start, sentence_end in _split_on(_SENTENCE_BREAK, text, paragraph_start, paragraph_end):
+            if sentence_start == sentence_end:
+                continue
+            tokens = count_tokens(text[sentence_start:sentence_end])
+            if tokens <= max_tokens:
+                yield sentence_start, sentence_end, tokens
+                continue
+
+            # A single sentence that is too long (tables, OCR noise): fall back to words
+            words_start = words_end = None
+            words_tokens = 0
+            for word_start, word_end in _split_on(_WORD_BREAK, text, sentence_start, sentence_end):
+                word_tokens = count_tokens(' ' + text[word_start:word_end])
+                if word_tokens > max_tokens:
+                    if words_start is not None:
+                        yield words_start, words_end, words_tokens
+                        words_start = None
+                        words_tokens = 0
+                    yield from _split_run(text, word_start, word_end, max_tokens)
+                    continue
+                if words_start is not None and words_tokens + word_tokens > max_tokens:
+                    yield words_start, words_end, words_tokens
+                    words_start = None
+                    words_tokens = 0
+                if words_start is None:
+                    words_start = word_start
+                words_end = word_end
+                words_tokens += word_tokens
+            if words_start is not None:
+                yield words_start, words_end, words_tokens
+
+
+def iter_chunk_offsets(text, max_tokens=None, overlap_tokens=None, paragraphs=None):
+    """
+    Splits `text` into chunks of at most `max_tokens` tokens, preferring paragraph and then
+    sentence boundaries, and yields each chunk as (start, end) offsets into `text`. Each
+    chunk starts with up to `overlap_tokens` tokens of the end of the previous chunk, so
+    content cut at a boundary is still seen in context.
+    `paragraphs` are (start, end) offsets of the paragraphs; by default text is split on blank lines.
+    Defaults come from CHUNK_MAX_TOKENS and CHUNK_OVERLAP_TOKENS.
+    """
+    if max_tokens is None:
+        max_tokens = settings.CHUNK_MAX_TOKENS
+    if overlap_tokens is None:
+        overlap_tokens = settings.CHUNK_OVERLAP_TOKENS
+
+    window = deque()
+    window_tokens = 0
+    has_new_content = False
+
+    if paragraphs is None:
+        paragraphs = _split_on(_PARAGRAPH_BREAK, text, 0, len(text))
+
+    for unit in _iter_units(text, paragraphs, max_tokens):
+        tokens = unit[2]
+        if window and window_tokens + tokens > max_tokens:
+            yield window[0][0], window[-1][1]
+            has_new_content = False
+
+            # Carry the tail of the chunk over as overlap
+            overlap = deque()
+            overlap_total = 0
+            for previous in reversed(window):
+                if overlap_total + previous[2] > overlap_tokens:
+                    break
+                overlap.appendleft(previous)
+                overlap_total += previous[2]
+            window, window_tokens = overlap, overlap_total
+
+            # Drop overlap until the new unit fits
+            while window and window_tokens + tokens > max_tokens:
+                window_tokens -= window.popleft()[2]
+
+        window.append(unit)
+        window_tokens += tokens
+        has_new_content = True
+
+    if window and has_new_content:
+        yield window[0][0], window[-1][1]
+
+
+def chunk_document(document, max_tokens=None, overlap_tokens=None):
+    """
+    Chunks a documents.Document, with its spans as paragraphs. Returns the chunks as
+    (start, end) offsets into the document's text.
+    """
+    return list(iter_chunk_offsets(
+        document.text, max_tokens, overlap_tokens, paragraphs=zip(document.starts, document.ends)))
+
+
+def chunk_text(source, max_tokens=None, overlap_tokens=None):
+    """
+    Same as iter_chunk_offsets, but yields the text of each chunk. `source` is a string or
+    an iterable of strings (e.g. one per page), which are joined as paragraphs.
+    """
+    if not isinstance(source, str):
+        source = '\n\n'.join(source)
+    for start, end in iter_chunk_offsets(source, max_tokens, overlap_tokens):
+        yield source[start:end]
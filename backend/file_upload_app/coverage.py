@@ -0,0 +1,110 @@
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from .retrieval import chunk_passages, tokenize
+
+
+def _term_matrix(token_lists, vocabulary, add_terms):
+    """
+    Sparse term-count matrix, one row per token list. Terms missing from `vocabulary` are
+    added to it if `add_terms`, and ignored otherwise.
+    """
+    if not add_terms:
+        token_lists = [[token for token in tokens if token in vocabulary] for tokens in token_lists]
+    columns = [vocabulary.setdefault(token, len(vocabulary)) for tokens in token_lists for token in tokens]
+    rows = np.repeat(np.arange(len(token_lists)), [len(tokens) for tokens in token_lists])
+    # Duplicate (row, column) entries are summed into term counts
+    return sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(token_lists), len(vocabulary)),
+    )
+
+
+def _tfidf(counts, idf):
+    """
+    Sublinear TF-IDF weights of a term-count matrix, with L2-normalized rows.
+    """
+    weights = counts.copy()
+    weights.data = 1 + np.log(weights.data)
+    weights = weights @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ weights
+
+
+def coverage_scores(passages, requirements, passage_terms=None):
+    """
+    Cosine similarity of the TF-IDF vectors of every passage and every requirement, as a
+    dense (passages x requirements) array, computed with one sparse matrix product.
+    The IDF weights come from the passages. `passage_terms` are the passages' terms if
+    they are already tokenized.
+    """
+    if passage_terms is None:
+        passage_terms = [tokenize(passage) for passage in passages]
+    vocabulary = {}
+    passage_counts = _term_matrix(passage_terms, vocabulary, add_terms=True)
+    requirement_counts = _term_matrix([tokenize(requirement) for requirement in requirements], vocabulary, add_terms=False)
+    document_frequency = np.bincount(passage_counts.indices, minlength=len(vocabulary))
+    idf = np.log((1 + len(passages)) / (1 + document_frequency)) + 1
+    scores = _tfidf(passage_counts, idf) @ _tfidf(requirement_counts, idf).T
+    return scores.toarray()
+
+
+def evidence_coverage(file_summaries, criteria_data, terms=None):
+    """
+    Scores every chunk against every entry of criteria_data['evidences'].
+    Returns the (file index, chunk index) pairs of the chunks, in document order, and the
+    (chunks x evidences) score array. `terms` are the chunks' terms from
+    retrieval.chunk_terms, if already computed.
+    """
+    chunk_ids, passages = chunk_passages(file_summaries)
+    requirements = [evidence['evidence_guidance'] for evidence in criteria_data['evidences']]
+    if not passages or not requirements:
+        return chunk_ids, np.zeros((len(passages), len(requirements)))
+    return chunk_ids, coverage_scores(passages, requirements, terms)
+
+
+def covering_chunks(chunk_ids, scores, per_evidence=None):
+    """
+    Returns the (file index, chunk index) pairs of the COVERAGE_CONTEXT_CHUNKS best chunks
+    for each evidence requirement, leaving out scores below COVERAGE_MIN_SCORE, without
+    duplicates.
+    """
+    per_evidence = settings.COVERAGE_CONTEXT_CHUNKS if per_evidence is None else per_evidence
+    selected = []
+    for column in range(scores.shape[1]):
+        for row in np.argsort(-scores[:, column])[:per_evidence]:
+            if scores[row, column] >= settings.COVERAGE_MIN_SCORE and chunk_ids[row] not in selected:
+                selected.append(chunk_ids[row])
+    return selected
+
+
+def coverage_report(file_summaries, criteria_data, chunk_ids, scores):
+    """
+    JSON-serializable coverage matrix for assessors: for every evidence requirement, its
+    best score and its COVERAGE_REPORT_PASSAGES best passages (file, location and score)
+    at or above COVERAGE_MIN_SCORE.
+    """
+    report = []
+    for column, evidence in enumerate(criteria_data['evidences']):
+        passages = []
+        for row in np.argsort(-scores[:, column])[:settings.COVERAGE_REPORT_PASSAGES]:
+            score = float(scores[row, column])
+            if score < settings.COVERAGE_MIN_SCORE:
+                break
+            file_index, chunk_index = chunk_ids[row]
+            file_summary = file_summaries[file_index]
+            start, end = file_summary['chunks'][chunk_index]
+            passages.append({
+                'file_name': file_summary['file_name'],
+                'location': file_summary['document'].location(start, end),
+                'chunk': chunk_index + 1,
+                'score': round(score, 3),
+            })
+        report.append({
+            'type': evidence['type'],
+            'evidence_guidance': evidence['evidence_guidance'],
+            'best_score': passages[0]['score'] if passages else 0.0,
+            'passages': passages,
+        })
+    return report
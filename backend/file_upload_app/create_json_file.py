@@ -1,6 +1,5 @@
 import json
 import os
-from django.conf import settings
 from datetime import date
 
 def load_json_file(file_path):
@@ -30,11 +29,11 @@ def merge_json_data(audit_data, project_data):
     }
     return merged_data
 
-def merge_audit_and_project_data():
+def merge_audit_and_project_data(workspace):
     # File paths
-    audit_file_path = os.path.join(settings.MEDIA_ROOT, 'final_output.json')
-    project_file_path = os.path.join(settings.MEDIA_ROOT, 'data.json')
-    output_file_path = os.path.join(settings.MEDIA_ROOT, 'merged_output.json')
+    audit_file_path = os.path.join(workspace, 'final_output.json')
+    project_file_path = os.path.join(workspace, 'data.json')
+    output_file_path = os.path.join(workspace, 'merged_output.json')
 
     # Load data from files
     audit_data = load_json_file(audit_file_path)
@@ -0,0 +1,45 @@
+import copy
+import threading
+import time
+from django.conf import settings
+from .database_service import get_db_connection, get_comprehensive_criteria_data
+
+# criteria_id -> (expires_at, criteria_data)
+_criteria_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_criteria_context(criteria_id):
+    """
+    Returns the comprehensive criteria data (category, issue, credits, guidance, evidence)
+    for the given criteria id, or None if the criteria does not exist.
+
+    Results are cached in memory for CRITERIA_CACHE_TTL seconds, so the pipeline and the
+    criteria endpoint only hit the database once per criteria id per process.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _criteria_cache.get(criteria_id)
+    if cached and cached[0] > now:
+        return copy.deepcopy(cached[1])
+
+    conn = get_db_connection()
+    try:
+        criteria_data = get_comprehensive_criteria_data(conn, criteria_id)
+    finally:
+        conn.close()
+
+    if criteria_data is None:
+        return None
+
+    with _cache_lock:
+        _criteria_cache[criteria_id] = (now + settings.CRITERIA_CACHE_TTL, criteria_data)
+    return copy.deepcopy(criteria_data)
+
+
+def clear_criteria_cache():
+    """
+    Drops all cached criteria data, e.g. after the criteria tables are repopulated.
+    """
+    with _cache_lock:
+        _criteria_cache.clear()
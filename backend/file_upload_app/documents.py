@@ -0,0 +1,218 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Kinds of span
+TEXT = 0
+TABLE_ROW = 1
+
+# Between the cells of a TABLE_ROW span
+TABLE_CELL_SEPARATOR = ' | '
+
+
+def join_cells(cells):
+    """
+    The text of a TABLE_ROW span. A '|' inside a cell becomes '¦' and line breaks become
+    spaces, so split_cells always gives back one value per cell, empty edge cells included.
+    """
+    return TABLE_CELL_SEPARATOR.join(
+        ' '.join(str(cell).replace('|', '¦').split()) for cell in cells
+    )
+
+
+def split_cells(text):
+    return text.split(TABLE_CELL_SEPARATOR)
+
+
+class Span:
+    """
+    One block of a document (a paragraph, a table row, a page of a PDF...) as offsets
+    into the document's text buffer.
+    """
+    __slots__ = ('start', 'end', 'locator', 'heading_path', 'kind')
+
+    def __init__(self, start, end, locator, heading_path, kind):
+        self.start = start
+        self.end = end
+        self.locator = locator
+        self.heading_path = heading_path
+        self.kind = kind
+
+    def __repr__(self):
+        return f"Span({self.start}, {self.end}, {self.locator!r}, {self.heading_path!r}, {self.kind})"
+
+
+class Document:
+    """
+    The text of one file in a single string buffer, with its spans stored column-wise in
+    arrays: start and end offsets, and indexes into shared tables of locators ('Side 3',
+    'Lysbilde 2', 'Ark: Avfall') and heading paths. Spans are separated by a newline.
+
+    Chunks are (start, end) offsets into `text`; the text of a chunk is only sliced out
+    when a prompt is built from it.
+    """
+    __slots__ = ('file_name', 'text', 'starts', 'ends', 'locator_ids', 'heading_ids', 'kinds',
+                 'locators', 'headings')
+
+    def __init__(self, file_name, text, starts, ends, locator_ids, heading_ids, kinds, locators, headings):
+        self.file_name = file_name
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.locator_ids = locator_ids
+        self.heading_ids = heading_ids
+        self.kinds = kinds
+        self.locators = locators
+        self.headings = headings
+
+    def __len__(self):
+        return len(self.starts)
+
+    def span(self, index):
+        return Span(
+            self.starts[index], self.ends[index], self.locators[self.locator_ids[index]],
+            self.headings[self.heading_ids[index]], self.kinds[index],
+        )
+
+    def __iter__(self):
+        return (self.span(index) for index in range(len(self)))
+
+    def span_text(self, index):
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def span_indexes(self, start=0, end=None):
+        """
+        Returns the range of indexes of the spans that overlap text[start:end].
+        """
+        end = len(self.text) if end is None else end
+        return range(bisect_right(self.ends, start), bisect_left(self.starts, end))
+
+    def location(self, start=0, end=None):
+        """
+        Human-readable location of text[start:end] for citations, e.g. 'Side 3–5' or
+        'Lysbilde 2, 4 Avfallshåndtering'.
+        """
+        indexes = self.span_indexes(start, end)
+        if not indexes:
+            return ''
+        first, last = indexes[0], indexes[-1]
+        parts = []
+        first_locator = self.locators[self.locator_ids[first]]
+        last_locator = self.locators[self.locator_ids[last]]
+        if first_locator and last_locator and first_locator != last_locator:
+            label, _, _ = first_locator.rpartition(' ')
+            last_label, _, last_number = last_locator.rpartition(' ')
+            if label == last_label and last_number.isdigit():
+                parts.append(f"{first_locator}–{last_number}")
+            else:
+                parts.append(f"{first_locator}–{last_locator}")
+        elif first_locator or last_locator:
+            parts.append(first_locator or last_locator)
+        heading_path = self.headings[self.heading_ids[first]]
+        if heading_path:
+            parts.append(heading_path[-1])
+        return ', '.join(parts)
+
+    def table_start(self, index):
+        """
+        Index of the first row (the header) of the table that the TABLE_ROW span `index` is
+        in: the run of table rows with the same locator and heading path.
+        """
+        while (index > 0 and self.kinds[index - 1] == TABLE_ROW
+               and self.locator_ids[index - 1] == self.locator_ids[index]
+               and self.heading_ids[index - 1] == self.heading_ids[index]):
+            index -= 1
+        return index
+
+    def render(self, start=0, end=None):
+        """
+        Returns text[start:end] with a '[locator]' line wherever the locator changes, so
+        the model can cite pages, slides and sheets. A range that starts inside a table
+        starts with the table's header row, so its rows keep their column names.
+        """
+        end = len(self.text) if end is None else end
+        lines = []
+        current_locator = None
+        indexes = self.span_indexes(start, end)
+        for index in indexes:
+            locator_id = self.locator_ids[index]
+            if locator_id != current_locator:
+                if self.locators[locator_id]:
+                    lines.append(f"[{self.locators[locator_id]}]")
+                elif current_locator is not None:
+                    # Back to text without a locator, e.g. the body after a DOCX header
+                    lines.append("[Brødtekst]")
+                current_locator = locator_id
+            if index == indexes[0] and self.kinds[index] == TABLE_ROW:
+                header = self.table_start(index)
+                if header < index:
+                    lines.append(self.span_text(header))
+            lines.append(self.text[max(self.starts[index], start):min(self.ends[index], end)])
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        """
+        JSON-serializable form, without the file name (the extraction cache shares it
+        between files with the same content).
+        """
+        return {
+            'text': self.text,
+            'spans': [list(self.starts), list(self.ends), list(self.locator_ids),
+                      list(self.heading_ids), list(self.kinds)],
+            'locators': self.locators,
+            'headings': [list(heading_path) for heading_path in self.headings],
+        }
+
+    @classmethod
+    def from_dict(cls, data, file_name):
+        starts, ends, locator_ids, heading_ids, kinds = data['spans']
+        return cls(
+            file_name, data['text'], array('l', starts), array('l', ends), array('l', locator_ids),
+            array('l', heading_ids), array('b', kinds), data['locators'],
+            [tuple(heading_path) for heading_path in data['headings']],
+        )
+
+
+class DocumentBuilder:
+    """
+    Collects the blocks of a file as they are extracted and joins them into a Document
+    in one go. Locators and heading paths are interned, so repeating them costs one
+    array entry per span.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.parts = []
+        self.length = 0
+        self.starts = array('l')
+        self.ends = array('l')
+        self.locator_ids = array('l')
+        self.heading_ids = array('l')
+        self.kinds = array('b')
+        self.locators = {'': 0}
+        self.headings = {(): 0}
+
+    def add(self, text, locator='', heading_path=(), kind=TEXT):
+        if kind == TABLE_ROW:
+            # Not stripped: an empty first or last cell still needs its separator
+            if not text.replace(TABLE_CELL_SEPARATOR, '').strip():
+                return
+        else:
+            text = text.strip()
+            if not text:
+                return
+        if self.parts:
+            self.parts.append('\n')
+            self.length += 1
+        self.starts.append(self.length)
+        self.parts.append(text)
+        self.length += len(text)
+        self.ends.append(self.length)
+        self.locator_ids.append(self.locators.setdefault(locator, len(self.locators)))
+        self.heading_ids.append(self.headings.setdefault(tuple(heading_path), len(self.headings)))
+        self.kinds.append(kind)
+
+    def build(self):
+        return Document(
+            self.file_name, ''.join(self.parts), self.starts, self.ends, self.locator_ids,
+            self.heading_ids, self.kinds, list(self.locators), list(self.headings),
+        )
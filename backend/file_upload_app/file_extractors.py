@@ -1,93 +1,706 @@
 # file_extractors.py
-from docx import Document
-from pptx import Presentation
+from lxml import etree
 from openpyxl import load_workbook
 import PyPDF2
+import pypdfium2 as pdfium
 from PIL import Image
+from django.conf import settings
+from contextlib import ExitStack, closing, contextmanager
+from multiprocessing.connection import wait
+import gzip
+import hashlib
+import json
+import multiprocessing
 import os
+import posixpath
+import re
+import resource
+import signal
+import time
+import zipfile
+from .chunker import chunk_document, get_encoding
+from .documents import TABLE_ROW, TEXT, Document, DocumentBuilder, join_cells
+from .normalization import strip_boilerplate
+from .tables import encode_tables
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+# Most pages of a PDF extracted (and OCR'd) at a time, see extract_pdf_pages
+PDF_PAGE_BATCH = 50
+
+# Least address space a page-range or OCR pool process is left when a sandbox's memory limit is split
+POOL_PROCESS_MIN_MEMORY_MB = 512
+
+# Page-range and OCR pool processes a sandbox may start, its share of EXTRACTION_WORKERS (set by extract_files)
+_pool_workers = None
+# Whether this process is a sandbox with an EXTRACTION_TIMEOUT alarm armed
+_timer_armed = False
+
+# Bump when an extractor changes its output, so cached extractions from the old code are not reused
+EXTRACTOR_VERSION = 8
+
+# OOXML (DOCX/PPTX) parts are streamed with lxml instead of building the python-docx/python-pptx object models
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+A_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+P_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+
+def _release(elem):
+    # Frees a fully read element and the siblings read before it
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+def _iter_ooxml_blocks(xml_file, ns):
+    """
+    Streams a WordprocessingML (`ns` = W_NS) or DrawingML (`ns` = A_NS) part and yields
+    (kind, text, style) in document order: (TEXT, text, paragraph style) for paragraphs
+    outside tables and (TABLE_ROW, 'cell | cell', None) for table rows.
+    Elements are cleared as soon as they are read, so memory does not grow with the part.
+    """
+    p, t, tbl, tr, tc = (f'{{{ns}}}{name}' for name in ('p', 't', 'tbl', 'tr', 'tc'))
+    tab, br, cr, p_style = f'{{{ns}}}tab', f'{{{ns}}}br', f'{{{ns}}}cr', f'{{{ns}}}pStyle'
+    cells = []  # text of the open table cells, innermost last
+    rows = []   # cells of the open table rows, innermost last
+    fallback_depth = 0
+
+    for event, elem in etree.iterparse(xml_file, events=('start', 'end'), tag=(p, tbl, tr, tc, MC_FALLBACK)):
+        if elem.tag == MC_FALLBACK:
+            # Legacy copies of text boxes in mc:AlternateContent would duplicate their text
+            fallback_depth += 1 if event == 'start' else -1
+            continue
+        if event == 'start':
+            if elem.tag == tr:
+                rows.append([])
+            elif elem.tag == tc:
+                cells.append([])
+            continue
+
+        if elem.tag == p:
+            if not fallback_depth:
+                text = ''.join(
+                    node.text or '' if node.tag == t else '\t' if node.tag == tab else '\n'
+                    for node in elem.iter(t, tab, br, cr)
+                ).strip()
+                if cells:
+                    if text:
+                        cells[-1].append(text)
+                elif text:
+                    style = elem.find(f'.//{p_style}')
+                    yield TEXT, text, style.get(f'{{{ns}}}val') if style is not None else None
+            # Clearing also drops paragraphs nested in text boxes, which were yielded on their own
+            _release(elem)
+        elif elem.tag == tc:
+            text = ' '.join(cells.pop())
+            if rows:
+                rows[-1].append(text)
+        elif elem.tag == tr:
+            # Empty cells are kept so the columns stay aligned
+            row = rows.pop()
+            if not any(row) or fallback_depth:
+                continue
+            if cells:
+                # A table nested in a table cell becomes part of that cell's text
+                cells[-1].append(join_cells(row))
+            else:
+                yield TABLE_ROW, join_cells(row), None
+        elif elem.tag == tbl:
+            _release(elem)
+
+def _heading_level(style):
+    """
+    Returns the outline level of a heading paragraph style ('Heading2' -> 2, 'Title' -> 1),
+    or None for other styles.
+    """
+    if not style or not style.lower().startswith(('heading', 'overskrift', 'title', 'tittel')):
+        return None
+    digits = re.search(r'\d+$', style)
+    return int(digits.group()) if digits else 1
+
+def iter_docx_blocks(file_path):
+    """
+    Yields (locator, heading_path, kind, text) for the headers, body paragraphs, table rows
+    and footers of a DOCX, in that order. The locator is 'Topptekst' or 'Bunntekst' for
+    headers and footers and '' for the body, whose blocks carry the path of headings they
+    are under. Text repeated in several headers or footers is only yielded once.
+    """
+    with zipfile.ZipFile(file_path) as docx_zip:
+        names = docx_zip.namelist()
+        headers = sorted(name for name in names if re.fullmatch(r'word/header\d*\.xml', name))
+        footers = sorted(name for name in names if re.fullmatch(r'word/footer\d*\.xml', name))
+
+        def iter_parts(part_names, locator):
+            seen = set()
+            for name in part_names:
+                with docx_zip.open(name) as part:
+                    for kind, text, _ in _iter_ooxml_blocks(part, W_NS):
+                        if text not in seen:
+                            seen.add(text)
+                            yield locator, (), kind, text
+
+        yield from iter_parts(headers, 'Topptekst')
+
+        heading_path = ()
+        with docx_zip.open('word/document.xml') as part:
+            for kind, text, style in _iter_ooxml_blocks(part, W_NS):
+                level = _heading_level(style)
+                if level:
+                    heading_path = heading_path[:level - 1] + (text,)
+                yield '', heading_path, kind, text
+
+        yield from iter_parts(footers, 'Bunntekst')
+
+def _slide_part_names(pptx_zip):
+    """
+    Returns the slide part names in presentation order (the order of sldIdLst, which is
+    not necessarily the order of the slideN.xml file names).
+    """
+    with pptx_zip.open('ppt/_rels/presentation.xml.rels') as rels_part:
+        targets = {
+            rel.get('Id'): rel.get('Target')
+            for rel in etree.parse(rels_part).getroot().iter(f'{{{REL_NS}}}Relationship')
+        }
+    with pptx_zip.open('ppt/presentation.xml') as presentation_part:
+        slide_ids = etree.parse(presentation_part).getroot().iter(f'{{{P_NS}}}sldId')
+        return [
+            posixpath.normpath(posixpath.join('ppt', targets[slide_id.get(f'{{{R_NS}}}id')]))
+            for slide_id in slide_ids
+        ]
+
+def iter_pptx_blocks(file_path):
+    """
+    Yields (slide_number, kind, text) for every paragraph and table row of every slide, in order.
+    """
+    with zipfile.ZipFile(file_path) as pptx_zip:
+        for slide_number, name in enumerate(_slide_part_names(pptx_zip), 1):
+            with pptx_zip.open(name) as part:
+                for kind, text, _ in _iter_ooxml_blocks(part, A_NS):
+                    yield slide_number, kind, text
 
 # DOCX Extractor
-def extract_text_from_docx(file_path):
-    doc = Document(file_path)
-    text = '\n'.join([paragraph.text for paragraph in doc.paragraphs])
-    return text
+def document_from_docx(file_path, builder):
+    for locator, heading_path, kind, text in iter_docx_blocks(file_path):
+        builder.add(text, locator, heading_path, kind)
 
 # PPTX Extractor
-def extract_text_from_pptx(file_path):
-    prs = Presentation(file_path)
-    text = []
-    for slide in prs.slides:
-        for shape in slide.shapes:
-            if hasattr(shape, "text"):
-                text.append(shape.text)
-    return '\n'.join(text)
+def document_from_pptx(file_path, builder):
+    for slide_number, kind, text in iter_pptx_blocks(file_path):
+        builder.add(text, f"Lysbilde {slide_number}", kind=kind)
 
 # XLSX Extractor
-def extract_text_from_xlsx(file_path):
-    workbook = load_workbook(filename=file_path)
-    text = []
-    for sheet in workbook:
-        for row in sheet.iter_rows(values_only=True):
-            text.append(' '.join([str(cell) for cell in row if cell is not None]))
-    return '\n'.join(text)
-
-# PDF Extractor
-def extract_text_from_pdf(file_path):
+def iter_xlsx_rows(file_path):
+    """
+    Yields (sheet_name, row_number, values) for every non-empty row, lazily, with '' for
+    empty cells so values line up with their columns. The workbook
+    is opened in read-only mode, which streams the sheet XML instead of loading every
+    cell, so memory stays flat however large the sheets are. Formulas give their last
+    calculated value.
+    """
+    workbook = load_workbook(filename=file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            for row_number, row in enumerate(sheet.iter_rows(values_only=True), 1):
+                values = ['' if cell is None else str(cell) for cell in row]
+                while values and not values[-1]:
+                    values.pop()
+                if any(values):
+                    yield sheet.title, row_number, values
+    finally:
+        workbook.close()
+
+def document_from_xlsx(file_path, builder):
+    for sheet_name, _, values in iter_xlsx_rows(file_path):
+        builder.add(join_cells(values), f"Ark: {sheet_name}", kind=TABLE_ROW)
+
+# PDF Extractors: yield (page_number, text) one page at a time, for pages [start, stop)
+def iter_pdf_pages_pdfium(file_path, start=0, stop=None):
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        for index in range(start, min(stop or len(pdf), len(pdf))):
+            page = pdf[index]
+            text_page = page.get_textpage()
+            try:
+                yield index + 1, text_page.get_text_bounded().replace('\r\n', '\n')
+            finally:
+                text_page.close()
+                page.close()
+    finally:
+        pdf.close()
+
+def iter_pdf_pages_pypdf2(file_path, start=0, stop=None):
     with open(file_path, 'rb') as pdf_file:
         reader = PyPDF2.PdfReader(pdf_file)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text()
+        for index in range(start, min(stop or len(reader.pages), len(reader.pages))):
+            yield index + 1, reader.pages[index].extract_text() or ''
+
+PDF_EXTRACTORS = {
+    'pdfium': iter_pdf_pages_pdfium,
+    'pypdf2': iter_pdf_pages_pypdf2,
+}
+
+def iter_pdf_pages(file_path, extractor=None, start=0, stop=None):
+    """
+    Yields (page_number, text) for every page, lazily. `extractor` is a key of
+    PDF_EXTRACTORS and defaults to the PDF_EXTRACTOR setting.
+    """
+    return PDF_EXTRACTORS[extractor or settings.PDF_EXTRACTOR](file_path, start, stop)
+
+def count_pdf_pages(file_path):
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def _pool_size(workers):
+    """
+    How many of `workers` pool processes fit in this process' memory limit (RLIMIT_AS, set
+    per sandbox by _sandboxed_extract_and_chunk): the limit is shared by the process and
+    its pool, and each of them gets at least POOL_PROCESS_MIN_MEMORY_MB of it.
+    """
+    soft, _ = resource.getrlimit(resource.RLIMIT_AS)
+    if soft == resource.RLIM_INFINITY:
+        return workers
+    return max(0, min(workers, soft // (POOL_PROCESS_MIN_MEMORY_MB * 1024 * 1024) - 1))
+
+@contextmanager
+def _extraction_pool(processes):
+    """
+    A fork Pool of `processes` processes, terminated when the block exits. Under a memory
+    limit, the limit is split evenly between this process and the pool processes (which
+    inherit it) while the pool runs, so together they stay within it; see _pool_size.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if soft != resource.RLIM_INFINITY:
+        resource.setrlimit(resource.RLIMIT_AS, (soft // (processes + 1), hard))
+    try:
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            yield pool
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+def _extract_pdf_page_range(arguments):
+    # Runs in a pool process; each process opens the document itself
+    file_path, extractor, start, stop = arguments
+    return list(iter_pdf_pages(file_path, extractor, start, stop))
+
+def extract_pdf_pages(file_path, extractor=None, workers=None, min_pages=None):
+    """
+    Yields the (page_number, text) records of a PDF in page order, a page range at a time
+    as soon as the range is extracted. PDFs with at least `min_pages` pages
+    (PDF_PARALLEL_MIN_PAGES) have their ranges extracted in a pool of `workers` processes
+    (in a sandbox its share of EXTRACTION_WORKERS, else EXTRACTION_WORKERS),
+    as many as fit in the memory limit.
+    Scanned pages without a text layer are OCR'd in the same pool, or in one started for
+    them if the PDF is not split, see ocr_textless_pages.
+
+    Closing the generator, or an exception such as an extraction timeout while it runs,
+    terminates the pool at once, so the pages yielded until then can still be used.
+    """
+    extractor = extractor or settings.PDF_EXTRACTOR
+    workers = _pool_size(workers or _pool_workers or settings.EXTRACTION_WORKERS or os.cpu_count() or 1)
+    min_pages = min_pages or settings.PDF_PARALLEL_MIN_PAGES
+
+    page_count = count_pdf_pages(file_path)
+    parallel = workers > 1 and page_count >= min_pages
+    # At least two ranges per process, so a range of dense pages does not leave the others
+    # idle, and at most PDF_PAGE_BATCH pages per range, so pages reach the caller steadily
+    range_size = min(-(-page_count // (workers * 2)), PDF_PAGE_BATCH) if parallel else PDF_PAGE_BATCH
+    ranges = [
+        (file_path, extractor, start, min(start + range_size, page_count))
+        for start in range(0, page_count, range_size)
+    ]
+    if parallel:
+        with _extraction_pool(workers) as pool:
+            for pages in pool.imap(_extract_pdf_page_range, ranges):
+                yield from ocr_textless_pages(file_path, pages, pool)
+        return
+
+    # Ranges are read here; a pool is only started once a range has several pages to OCR
+    with ExitStack() as stack:
+        pool = None
+        for page_range in ranges:
+            pages = _extract_pdf_page_range(page_range)
+            if pool is None and workers > 1 and pytesseract is not None and len(_textless_pages(pages)) > 1:
+                pool = stack.enter_context(_extraction_pool(workers))
+            yield from ocr_textless_pages(file_path, pages, pool)
+
+def _ocr_image(image):
+    if pytesseract is None:
+        raise RuntimeError("OCR needs pytesseract and a local Tesseract installation")
+    return pytesseract.image_to_string(image, lang=settings.OCR_LANGUAGES)
+
+def _ocr_pdf_page(file_path, page_number):
+    """
+    Runs in a pool process: renders one page and OCRs it. The result is cached by a hash
+    of the rendered image, so the same scanned page is only OCR'd once, in any document.
+    """
+    pdf = pdfium.PdfDocument(file_path)
+    try:
+        page = pdf[page_number - 1]
+        try:
+            image = page.render(scale=settings.OCR_DPI / 72, grayscale=True).to_pil()
+        finally:
+            page.close()
+    finally:
+        pdf.close()
+
+    page_hash = hashlib.sha256(image.tobytes())
+    page_hash.update(f"{image.size}:{settings.OCR_LANGUAGES}".encode('utf-8'))
+    page_hash = page_hash.hexdigest()
+    cached = load_cached_extraction(page_hash, '.ocr')
+    if cached is not None:
+        return cached['text']
+
+    text = _ocr_image(image)
+    store_cached_extraction(page_hash, '.ocr', {'text': text})
     return text
 
+def _try_ocr_pdf_page(file_path, page_number):
+    try:
+        return _ocr_pdf_page(file_path, page_number), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def _textless_pages(pages):
+    # Indexes of the pages to OCR: those with less than OCR_MIN_PAGE_CHARS characters
+    if not settings.OCR_ENABLED:
+        return []
+    return [index for index, (_, text) in enumerate(pages) if len(text.strip()) < settings.OCR_MIN_PAGE_CHARS]
+
+def ocr_textless_pages(file_path, pages, pool=None):
+    """
+    Replaces the text of pages with less than OCR_MIN_PAGE_CHARS characters (scanned
+    pages without a text layer) by OCR of the rendered page, OCR'ing them in `pool`
+    if given. Pages that fail to OCR keep their extracted text.
+    """
+    textless = _textless_pages(pages)
+    if not textless:
+        return pages
+    if pytesseract is None:
+        print(f"{len(textless)} pages of {file_path} have no text layer, but pytesseract is not installed")
+        return pages
+
+    arguments = [(file_path, pages[index][0]) for index in textless]
+    if pool is not None and len(textless) > 1:
+        results = pool.starmap(_try_ocr_pdf_page, arguments)
+    else:
+        results = [_try_ocr_pdf_page(*page) for page in arguments]
+
+    pages = list(pages)
+    for index, (_, page_number), (text, error) in zip(textless, arguments, results):
+        if error:
+            print(f"OCR failed for page {page_number} of {file_path}: {error}")
+        else:
+            pages[index] = (page_number, text)
+    return pages
+
+def document_from_pdf(file_path, builder):
+    # Pages are added as they come, so a timeout keeps the pages read until then
+    with closing(extract_pdf_pages(file_path)) as pages:
+        for page_number, text in pages:
+            builder.add(text, f"Side {page_number}")
+
 # Image (JPG/PNG) Extractor
-def extract_text_from_image(file_path):
+def document_from_image(file_path, builder):
     img = Image.open(file_path)
-    text = pytesseract.image_to_string(img)
-    return text
+    builder.add(_ocr_image(img))
+
+DOCUMENT_EXTRACTORS = {
+    '.docx': document_from_docx,
+    '.pptx': document_from_pptx,
+    '.xlsx': document_from_xlsx,
+    '.pdf': document_from_pdf,
+    '.jpg': document_from_image,
+    '.png': document_from_image,
+}
+
+class ExtractionTimeout(Exception):
+    pass
+
+class PartialExtraction(Exception):
+    """
+    Extraction was cut short (time or memory limit); `document` holds what was read until then.
+    """
+    def __init__(self, document, reason):
+        super().__init__(reason)
+        self.document = document
 
 # Main function to handle different file types
+def extract_document(file_path):
+    """
+    Extracts a file into a documents.Document, with a span per paragraph, table row,
+    PDF page and so on. Raises PartialExtraction if a time or memory limit interrupts
+    the extraction after some of the file was read.
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in DOCUMENT_EXTRACTORS:
+        raise ValueError(f"Unsupported file type: {ext}")
+    builder = DocumentBuilder(os.path.basename(file_path))
+    try:
+        DOCUMENT_EXTRACTORS[ext](file_path, builder)
+        # The time limit is for the extractor; caching, normalizing and chunking the document run without it
+        _stop_extraction_timer()
+    except (ExtractionTimeout, MemoryError) as e:
+        if not len(builder.starts):
+            raise
+        raise PartialExtraction(builder.build(), f"{type(e).__name__} after {len(builder.starts)} blocks")
+    return builder.build()
+
 def extract_text_from_file(file_path):
+    return extract_document(file_path).render()
+
+# Save an upload to disk, hashing it while it streams
+def save_uploaded_file(uploaded_file, file_path):
+    """
+    Writes an uploaded file to `file_path` chunk by chunk and returns its SHA-256 hex digest.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'wb+') as destination:
+        for chunk in uploaded_file.chunks():
+            sha256.update(chunk)
+            destination.write(chunk)
+    return sha256.hexdigest()
+
+def hash_file(file_path):
+    """
+    Returns the SHA-256 hex digest of a file on disk.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+# Extraction cache: gzip-compressed JSON under EXTRACTION_CACHE_DIR, keyed by content hash
+def _extraction_cache_path(sha256, ext):
+    return os.path.join(
+        settings.EXTRACTION_CACHE_DIR, sha256[:2], f"{sha256}{ext}.v{EXTRACTOR_VERSION}.json.gz")
+
+def load_cached_extraction(sha256, ext):
+    """
+    Returns the cached extraction for a file hash, or None. A hit refreshes the entry's
+    modification time, which eviction uses as its recency.
+    """
+    cache_path = _extraction_cache_path(sha256, ext)
+    try:
+        with gzip.open(cache_path, 'rt', encoding='utf-8') as f:
+            extraction = json.load(f)
+        os.utime(cache_path)
+        return extraction
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Discarding unreadable extraction cache entry {cache_path}: {e}")
+        return None
+
+def store_cached_extraction(sha256, ext, extraction):
+    """
+    Caches an extraction under its file hash. Best effort: a cache that cannot be written
+    (full disk, permissions) is logged and otherwise ignored.
+    """
+    cache_path = _extraction_cache_path(sha256, ext)
+    # Write to a temporary file first so concurrent readers never see a partial entry
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(extraction, f, ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write extraction cache entry {cache_path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+def extract_document_cached(file_path, sha256=None):
+    """
+    Same as extract_document, but reuses the document extracted earlier from a file with
+    the same content, across tasks and projects. `sha256` is computed if not given.
+    Partial extractions are not cached.
+    """
     ext = os.path.splitext(file_path)[1].lower()
-    if ext == '.docx':
-        return extract_text_from_docx(file_path)
-    elif ext == '.pptx':
-        return extract_text_from_pptx(file_path)
-    elif ext == '.xlsx':
-        return extract_text_from_xlsx(file_path)
-    elif ext == '.pdf':
-        return extract_text_from_pdf(file_path)
-    elif ext in ['.jpg', '.png']:
-        return extract_text_from_image(file_path)
-    else:
+    if ext not in DOCUMENT_EXTRACTORS:
         raise ValueError(f"Unsupported file type: {ext}")
+    sha256 = sha256 or hash_file(file_path)
+    cached = load_cached_extraction(sha256, ext)
+    if cached is not None:
+        return Document.from_dict(cached, os.path.basename(file_path))
 
-def chunk_text(text, max_tokens=7500):
-    words = text.split()
-    chunks = []
-    current_chunk = []
+    document = extract_document(file_path)
+    store_cached_extraction(sha256, ext, document.to_dict())
+    return document
 
-    for word in words:
-        if len(current_chunk) + len(word.split()) <= max_tokens:
-            current_chunk.append(word)
-        else:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [word]
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    return chunks
-
-def process_files_in_directory(directory):
-    file_summaries = []
-    for file_name in os.listdir(directory):
-        file_path = os.path.join(directory, file_name)
+def evict_extraction_cache():
+    """
+    Deletes the least recently used cache entries until the cache fits in
+    EXTRACTION_CACHE_MAX_BYTES. Returns the number of entries deleted.
+    """
+    entries = []
+    total_size = 0
+    for root, _, file_names in os.walk(settings.EXTRACTION_CACHE_DIR):
+        for file_name in file_names:
+            path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+
+    deleted = 0
+    for _, size, path in sorted(entries):
+        if total_size <= settings.EXTRACTION_CACHE_MAX_BYTES:
+            break
         try:
-            file_text = extract_text_from_file(file_path)
-            chunks = chunk_text(file_text)
-            file_summaries.append({
-                "file_name": file_name,
-                "chunks": chunks
-            })
-        except Exception as e:
-            print(f"Failed to process file {file_name}: {e}")
-    return file_summaries
\ No newline at end of file
+            os.remove(path)
+            deleted += 1
+        except FileNotFoundError:
+            pass
+        total_size -= size
+    return deleted
+
+def _extract_and_chunk(file_path, sha256):
+    """
+    Returns (document, chunk offsets, stats, None), or (None, None, None, error) so one
+    broken file does not fail the others. The stats count the tokens saved by
+    normalization.strip_boilerplate and tables.encode_tables, and whether the document
+    is only partly extracted.
+    """
+    try:
+        partial = False
+        try:
+            document = extract_document_cached(file_path, sha256)
+        except PartialExtraction as e:
+            print(f"Using partial extraction of {os.path.basename(file_path)}: {e}")
+            document, partial = e.document, True
+        _stop_extraction_timer()
+        document, boilerplate_tokens = strip_boilerplate(document)
+        document, table_tokens = encode_tables(document)
+        stats = {
+            'boilerplate_tokens_removed': boilerplate_tokens,
+            'table_tokens_saved': table_tokens,
+            'extraction_partial': partial,
+        }
+        return document, chunk_document(document), stats, None
+    except Exception as e:
+        return None, None, None, f"{type(e).__name__}: {e}"
+
+def _stop_extraction_timer():
+    if _timer_armed:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+def _interrupt_extraction(signum, frame):
+    raise ExtractionTimeout(f"extraction took more than {settings.EXTRACTION_TIMEOUT} s")
+
+def _sandboxed_extract_and_chunk(connection, file_path, sha256, pool_workers):
+    """
+    Entry point of a sandbox process: runs _extract_and_chunk under EXTRACTION_MEMORY_LIMIT_MB
+    of address space and an EXTRACTION_TIMEOUT alarm on the extraction itself, with at most
+    `pool_workers` page-range or OCR processes, and sends the result back.
+    """
+    global _pool_workers, _timer_armed
+    _pool_workers = pool_workers
+    # Own process group, so killing the sandbox also stops the page-range and OCR processes it starts
+    os.setpgrp()
+    if settings.EXTRACTION_MEMORY_LIMIT_MB:
+        limit = settings.EXTRACTION_MEMORY_LIMIT_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if settings.EXTRACTION_TIMEOUT:
+        signal.signal(signal.SIGALRM, _interrupt_extraction)
+        signal.setitimer(signal.ITIMER_REAL, settings.EXTRACTION_TIMEOUT)
+        _timer_armed = True
+    result = _extract_and_chunk(file_path, sha256)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    connection.send(result)
+    connection.close()
+
+def _kill_sandbox(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        # Killed before it had its own process group
+        process.kill()
+    process.join()
+
+def extract_files(directory, file_hashes=None, on_result=None):
+    """
+    Extracts and chunks every file in `directory` in parallel, each in its own sandbox
+    process, at most EXTRACTION_WORKERS at a time. The same EXTRACTION_WORKERS processes are
+    shared out between the running sandboxes for their page-range and OCR pools.
+    A sandbox is limited to EXTRACTION_MEMORY_LIMIT_MB of memory and EXTRACTION_TIMEOUT
+    seconds: at the timeout the extractor stops and the part read so far is used, and a
+    sandbox still running EXTRACTION_KILL_GRACE seconds later is killed. A crash or kill
+    only fails that one file, never the calling process.
+
+    Returns one {'file_name', 'document', 'chunks', 'stats'} or {'file_name', 'error'}
+    dict per file, where chunks are (start, end) offsets into the document's text and
+    stats are described in _extract_and_chunk, sorted by file name whatever order they
+    finish in. `on_result(done, total, file_name)` is called as each file finishes.
+    """
+    file_hashes = file_hashes or {}
+    file_names = sorted(os.listdir(directory))
+    results = [None] * len(file_names)
+    workers = settings.EXTRACTION_WORKERS or os.cpu_count() or 1
+    context = multiprocessing.get_context('fork')
+    # Load the tokenizer before forking, so the sandboxes inherit it instead of each loading
+    # (or downloading) the BPE file again
+    get_encoding()
+
+    def collect(index, document, chunks, stats, error):
+        if error:
+            results[index] = {'file_name': file_names[index], 'error': error}
+        else:
+            results[index] = {
+                'file_name': file_names[index], 'document': document, 'chunks': chunks,
+                'stats': stats,
+            }
+        if on_result:
+            on_result(sum(result is not None for result in results), len(file_names), file_names[index])
+
+    pending = list(enumerate(file_names))
+    running = {}  # receiving end of the result pipe -> (index, process, kill deadline)
+    while pending or running:
+        while pending and len(running) < workers:
+            # The task's processes left to each of the sandboxes running from now on, so nested
+            # pools do not start workers * workers processes
+            pool_workers = max(1, workers // min(workers, len(running) + len(pending)))
+            index, file_name = pending.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(
+                target=_sandboxed_extract_and_chunk,
+                args=(sender, os.path.join(directory, file_name), file_hashes.get(file_name), pool_workers),
+            )
+            process.start()
+            sender.close()
+            deadline = None
+            if settings.EXTRACTION_TIMEOUT:
+                deadline = time.monotonic() + settings.EXTRACTION_TIMEOUT + settings.EXTRACTION_KILL_GRACE
+            running[receiver] = (index, process, deadline)
+
+        for receiver in wait(list(running), timeout=1):
+            index, process, _ = running.pop(receiver)
+            try:
+                result = receiver.recv()
+            except EOFError:
+                process.join()
+                # Crashed, e.g. a segfault in a parser or MemoryError outside the extractor
+                result = (None, None, None, f"extraction process exited with code {process.exitcode}")
+            receiver.close()
+            process.join()
+            collect(index, *result)
+
+        now = time.monotonic()
+        for receiver, (index, process, deadline) in list(running.items()):
+            if deadline and now > deadline:
+                _kill_sandbox(process)
+                receiver.close()
+                del running[receiver]
+                collect(index, None, None, None, f"extraction killed after {settings.EXTRACTION_TIMEOUT + settings.EXTRACTION_KILL_GRACE} s")
+    return results
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import threading
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import LLMResponse
+
+# Hits and misses in this process since it started
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def cache_key(model, params, prompt):
+    """
+    Content address of a request: identical model, parameters and prompt give the same key.
+    """
+    payload = json.dumps({'model': model, 'params': params, 'prompt': prompt}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _count(hits, misses):
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+
+def cache_stats():
+    """
+    Returns the hit and miss counts of this process, e.g. {'hits': 12, 'misses': 3}.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def get_cached_responses(keys):
+    """
+    Looks up several keys in one query and returns {key: response} for the ones cached.
+    Found entries are marked as recently used.
+    """
+    if not settings.LLM_CACHE_ENABLED or not keys:
+        return {}
+
+    found = dict(LLMResponse.objects.filter(key__in=keys).values_list('key', 'response'))
+    if found:
+        LLMResponse.objects.filter(key__in=list(found)).update(
+            hits=F('hits') + 1, last_used_at=timezone.now())
+    _count(len(found), len(set(keys)) - len(found))
+    return found
+
+
+def store_responses(model, responses):
+    """
+    Saves {key: response} pairs. Keys that are already cached are left untouched.
+    """
+    if not settings.LLM_CACHE_ENABLED or not responses:
+        return
+
+    now = timezone.now()
+    LLMResponse.objects.bulk_create(
+        [
+            LLMResponse(
+                key=key, model=model, response=response,
+                size_bytes=len(response.encode('utf-8')), last_used_at=now,
+            )
+            for key, response in responses.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def evict_llm_cache():
+    """
+    Deletes least recently used entries until the cache is within LLM_CACHE_MAX_ENTRIES
+    and LLM_CACHE_MAX_BYTES. Returns the number of entries deleted.
+    """
+    deleted = 0
+
+    excess = LLMResponse.objects.count() - settings.LLM_CACHE_MAX_ENTRIES
+    if excess > 0:
+        oldest = LLMResponse.objects.order_by('last_used_at').values_list('key', flat=True)[:excess]
+        deleted += LLMResponse.objects.filter(key__in=list(oldest)).delete()[0]
+
+    while (LLMResponse.objects.aggregate(total=Sum('size_bytes'))['total'] or 0) > settings.LLM_CACHE_MAX_BYTES:
+        oldest = LLMResponse.objects.order_by('last_used_at').values_list('key', flat=True)[:1000]
+        deleted += LLMResponse.objects.filter(key__in=list(oldest)).delete()[0]
+
+    return deleted
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def dispatch_prompts(prompts, send, max_concurrency, timeout=None, on_result=None):
+    """
+    Sends every prompt through `send(prompt, timeout=timeout)` with at most
+    `max_concurrency` calls in flight, and returns the responses in the same order
+    as `prompts`.
+
+    A call that fails (including timing out) leaves None in its slot and the error
+    is printed, so one bad chunk does not lose the rest of the batch.
+    `on_result(done, total, index)` is called from the calling thread as each call
+    finishes, so it can safely touch the database.
+    """
+    results = [None] * len(prompts)
+    if not prompts:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(prompts)))) as executor:
+        futures = {
+            executor.submit(send, prompt, timeout=timeout): index
+            for index, prompt in enumerate(prompts)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"Prompt {index + 1} of {len(prompts)} failed: {e}")
+            if on_result:
+                on_result(done, len(prompts), index)
+
+    return results
@@ -0,0 +1,180 @@
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from multiprocessing.connection import wait
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connections
+from file_upload_app.ai_integration import usage_stats
+from file_upload_app.file_extractors import evict_extraction_cache
+from file_upload_app.llm_cache import cache_stats, evict_llm_cache
+from file_upload_app.pipeline import run_assessment_pipeline
+from file_upload_app.task_queue import (
+    claim_next_task,
+    set_stage,
+    set_progress,
+    record_metrics,
+    complete_task,
+    fail_task,
+    fail_exhausted_tasks,
+    purge_expired_tasks,
+)
+
+
+def record_llm_metrics(task, cache_before, usage_before):
+    cache_after = cache_stats()
+    usage_after = usage_stats()
+    record_metrics(
+        task,
+        llm_cache_hits=cache_after['hits'] - cache_before['hits'],
+        llm_cache_misses=cache_after['misses'] - cache_before['misses'],
+        # OpenAI usage; llm_cached_tokens are prompt tokens served from the provider's prompt cache
+        llm_requests=usage_after['requests'] - usage_before['requests'],
+        llm_request_seconds=round(usage_after['request_seconds'] - usage_before['request_seconds'], 2),
+        llm_prompt_tokens=usage_after['prompt_tokens'] - usage_before['prompt_tokens'],
+        llm_cached_tokens=usage_after['cached_tokens'] - usage_before['cached_tokens'],
+        llm_completion_tokens=usage_after['completion_tokens'] - usage_before['completion_tokens'],
+    )
+
+
+def record_outcome(worker_name, task, record, poll_interval):
+    """
+    Calls `record()`, which writes a task's metrics and outcome. If the database connection
+    broke during the task, reconnects and tries once more; a task whose outcome still cannot
+    be written is left to its lease running out, so another worker picks it up again.
+    """
+    for attempt in range(2):
+        try:
+            record()
+            return
+        except DatabaseError as e:
+            print(f"Worker {worker_name} could not record the outcome of task {task.id}: {e}")
+            connections.close_all()
+            if attempt == 0:
+                time.sleep(poll_interval)
+
+
+def run_worker(worker_name, poll_interval, once=False):
+    """
+    Claims and runs queued tasks until stopped. With `once`, exits when the queue is empty.
+    """
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    print(f"Worker {worker_name} started")
+    last_purge = 0
+    while not stopping:
+        try:
+            if time.monotonic() - last_purge >= settings.TASK_PURGE_INTERVAL:
+                fail_exhausted_tasks()
+                purge_expired_tasks()
+                evict_llm_cache()
+                evict_extraction_cache()
+                last_purge = time.monotonic()
+            task = claim_next_task(worker_name)
+        except DatabaseError as e:
+            # Database not reachable or not migrated yet; retry after a pause
+            print(f"Worker {worker_name} could not poll the task queue: {e}")
+            connections.close_all()
+            time.sleep(poll_interval)
+            continue
+
+        if task is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        print(f"Worker {worker_name} processing task {task.id}")
+        # This process runs one task at a time, so the change in its cache and usage counters belongs to this task
+        cache_before = cache_stats()
+        usage_before = usage_stats()
+        try:
+            output_file = run_assessment_pipeline(
+                task,
+                on_stage=lambda stage: set_stage(task, stage),
+                on_progress=lambda current, total, detail: set_progress(task, current, total, detail),
+                on_metrics=lambda **metrics: record_metrics(task, **metrics),
+            )
+            error = None
+            print(f"Task {task.id} completed")
+        except Exception as e:
+            error = str(e)
+            print(f"Task {task.id} failed: {e}")
+
+        def record():
+            record_llm_metrics(task, cache_before, usage_before)
+            if error is None:
+                complete_task(task, output_file)
+            else:
+                fail_task(task, error)
+
+        record_outcome(worker_name, task, record, poll_interval)
+
+    print(f"Worker {worker_name} stopped")
+
+
+class Command(BaseCommand):
+    help = 'Runs a pool of worker processes that claim and process queued upload tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.TASK_WORKER_CONCURRENCY,
+                            help='Number of worker processes to run.')
+        parser.add_argument('--poll-interval', type=float, default=settings.TASK_POLL_INTERVAL,
+                            help='Seconds to wait between polls when the queue is empty.')
+        parser.add_argument('--once', action='store_true',
+                            help='Process the queued tasks and exit instead of polling forever.')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        poll_interval = options['poll_interval']
+        once = options['once']
+        hostname = socket.gethostname()
+
+        if workers == 1:
+            run_worker(f"{hostname}:{os.getpid()}", poll_interval, once)
+            return
+
+        # Forked children must not share the parent's database connection
+        connections.close_all()
+
+        def start_worker(i):
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(f"{hostname}:{os.getpid()}:{i}", poll_interval, once),
+            )
+            process.start()
+            return process
+
+        processes = [start_worker(i) for i in range(workers)]
+        stopping = False
+
+        def stop_children(signum, frame):
+            nonlocal stopping
+            stopping = True
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        signal.signal(signal.SIGTERM, stop_children)
+        signal.signal(signal.SIGINT, stop_children)
+
+        while True:
+            for i, process in enumerate(processes):
+                if not stopping and not process.is_alive() and process.exitcode != 0:
+                    # Crashed or killed (e.g. out of memory); its task is re-claimed once its lease runs out
+                    print(f"Worker {i} exited with code {process.exitcode}, starting a new one")
+                    processes[i] = start_worker(i)
+            running = [process.sentinel for process in processes if process.is_alive()]
+            if not running:
+                break
+            wait(running)
+        self.stdout.write(self.style.SUCCESS(f"All {workers} workers stopped"))
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:10
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_upload_app', '0002_assessmentcriteria_assessmentissue_category_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingTask',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('completed', 'Completed'), ('error', 'Error')], default='queued', max_length=20)),
+                ('project_data', models.JSONField()),
+                ('attempts', models.IntegerField(default=0)),
+                ('worker', models.CharField(blank=True, default='', max_length=255)),
+                ('message', models.TextField(blank=True, default='')),
+                ('output_file', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='task_status_created_idx')],
+            },
+        ),
+    ]
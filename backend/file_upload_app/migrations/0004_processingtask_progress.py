@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_upload_app', '0003_processingtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingtask',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='progress_current',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='progress_detail',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='progress_total',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='stage',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='stage_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
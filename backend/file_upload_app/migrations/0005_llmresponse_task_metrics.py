@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-18 01:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file_upload_app', '0004_processingtask_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMResponse',
+            fields=[
+                ('key', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('model', models.CharField(max_length=100)),
+                ('response', models.TextField()),
+                ('size_bytes', models.IntegerField()),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='processingtask',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
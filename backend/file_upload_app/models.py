@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 
 class Category(models.Model):
@@ -18,3 +19,55 @@ class AssessmentCriteria(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     type = models.CharField(max_length=50)
+
+class ProcessingTask(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_PROCESSING = 'processing'
+    STATUS_COMPLETED = 'completed'
+    STATUS_ERROR = 'error'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_PROCESSING, 'Processing'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_ERROR, 'Error'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    project_data = models.JSONField()
+    attempts = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    message = models.TextField(blank=True, default='')
+    output_file = models.CharField(max_length=255, blank=True, default='')
+    # Current pipeline stage and progress within it, e.g. 14/52 "chunk 14/52 of report.pdf"
+    stage = models.CharField(max_length=20, blank=True, default='')
+    stage_started_at = models.DateTimeField(null=True, blank=True)
+    progress_current = models.IntegerField(default=0)
+    progress_total = models.IntegerField(default=0)
+    progress_detail = models.CharField(max_length=255, blank=True, default='')
+    # Seconds spent in each finished stage, e.g. {"fetch": 0.4, "process": 12.1}
+    stage_timings = models.JSONField(default=dict, blank=True)
+    # Counters collected while processing, e.g. {"llm_cache_hits": 12, "llm_cache_misses": 3}
+    metrics = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Set when the task reaches a terminal state; expired rows are purged by the workers
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Workers claim the oldest queued task first
+            models.Index(fields=['status', 'created_at'], name='task_status_created_idx'),
+        ]
+
+class LLMResponse(models.Model):
+    # SHA-256 of the model, request parameters and prompt
+    key = models.CharField(max_length=64, primary_key=True)
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    size_bytes = models.IntegerField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
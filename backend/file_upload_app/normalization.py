@@ -0,0 +1,92 @@
+import re
+from collections import defaultdict
+from django.conf import settings
+from .chunker import count_tokens
+from .documents import TABLE_ROW, DocumentBuilder
+
+_SPACES = re.compile(r'\s+')
+_LETTER = re.compile(r'[^\W\d_]')
+# Numbers that change from page to page in headers and footers: page numbers ("side 3 av 40",
+# "page 3") starting or ending the line, dates, and a number (or "3/40", "3 av 40") ending the
+# line or making it up alone. "Se side 12" inside a sentence is content and is not masked
+_PAGE_NUMBER = re.compile(r'^(?:side|page)\s+\d+(?:\s*(?:av|of|/)\s*\d+)?\b|\b(?:side|page)\s+\d+(?:\s*(?:av|of|/)\s*\d+)?$')
+_DATE = re.compile(r'\b\d{1,4}[./-]\d{1,2}[./-]\d{2,4}\b')
+_TRAILING_NUMBER = re.compile(r'(?<!\S)\d+(?:\s*(?:av|of|/)\s*\d+)?$')
+
+
+def _line_key(line):
+    # Page numbers and dates vary between the pages of a header or footer, so they are masked;
+    # other numbers are content, and lines that differ in them are different lines
+    key = _SPACES.sub(' ', line.strip().lower())
+    key = _PAGE_NUMBER.sub('#', _DATE.sub('#', key))
+    return _TRAILING_NUMBER.sub('#', key)
+
+
+def is_low_information(line):
+    """
+    True for lines that are mostly digits, punctuation or symbols (OCR noise, number runs),
+    judged by the share of letters among non-space characters.
+    """
+    characters = len(line) - line.count(' ')
+    if characters < settings.LOW_INFORMATION_MIN_CHARS:
+        return False
+    return len(_LETTER.findall(line)) / characters < settings.LOW_INFORMATION_LETTER_RATIO
+
+
+def repeated_lines(document):
+    """
+    Returns the keys (see _line_key) of the text lines that occur on at least
+    BOILERPLATE_PAGE_RATIO of the pages/slides of a document with at least
+    BOILERPLATE_MIN_PAGES of them: running headers, footers, revision blocks and disclaimers.
+    Table rows are not counted, since repeated rows are data.
+    """
+    pages = defaultdict(set)
+    for index in range(len(document)):
+        if document.kinds[index] == TABLE_ROW:
+            continue
+        locator_id = document.locator_ids[index]
+        for line in document.span_text(index).split('\n'):
+            key = _line_key(line)
+            if key:
+                pages[key].add(locator_id)
+
+    page_count = len(set(document.locator_ids))
+    if page_count < settings.BOILERPLATE_MIN_PAGES:
+        return set()
+    threshold = max(settings.BOILERPLATE_MIN_PAGES, page_count * settings.BOILERPLATE_PAGE_RATIO)
+    return {key for key, locator_ids in pages.items() if len(locator_ids) >= threshold}
+
+
+def strip_boilerplate(document):
+    """
+    Returns a copy of `document` without repeated boilerplate lines (the first occurrence
+    of each is kept, so the document's title block is still seen once) and without
+    low-information lines, together with the number of tokens removed.
+    """
+    boilerplate = repeated_lines(document)
+    seen = set()
+    removed = []
+    builder = DocumentBuilder(document.file_name)
+
+    for index in range(len(document)):
+        text = document.span_text(index)
+        if document.kinds[index] != TABLE_ROW:
+            kept = []
+            for line in text.split('\n'):
+                if is_low_information(line):
+                    removed.append(line)
+                    continue
+                key = _line_key(line)
+                if key in boilerplate:
+                    if key in seen:
+                        removed.append(line)
+                        continue
+                    seen.add(key)
+                kept.append(line)
+            text = '\n'.join(kept)
+        span = document.span(index)
+        builder.add(text, span.locator, span.heading_path, span.kind)
+
+    if not removed:
+        return document, 0
+    return builder.build(), count_tokens('\n'.join(removed))
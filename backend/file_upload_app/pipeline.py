@@ -0,0 +1,118 @@
+from django.conf import settings
+import json
+import os
+from .ai_integration import (
+    process_files_in_directory,
+    calculate_total_points,
+    finalize_summaries,
+    save_response_as_json,
+)
+from .criteria_context import get_criteria_context
+from .coverage import coverage_report, covering_chunks, evidence_coverage
+from .create_json_file import merge_audit_and_project_data, save_json_file
+from .generate_report import create_word_document
+from .retrieval import chunk_terms, retrieve_chunks
+from .summarization import map_chunks, reduce_notes
+from .workspace import task_workspace_path, task_workspace_relpath, task_upload_dir
+
+# Stages of the assessment workflow, in the order they run
+PIPELINE_STAGES = ['fetch', 'process', 'map', 'reduce', 'finalize', 'render']
+
+
+def load_file_hashes(workspace):
+    """
+    Returns the {file name: SHA-256} map recorded at upload, or {} for tasks uploaded without one.
+    """
+    try:
+        with open(os.path.join(workspace, 'file_hashes.json'), 'r') as hashes_file:
+            return json.load(hashes_file)
+    except FileNotFoundError:
+        return {}
+
+
+def run_assessment_pipeline(task, on_stage=None, on_progress=None, on_metrics=None):
+    """
+    Runs the full assessment workflow for a task: fetches the criteria, sends the
+    uploaded documents to OpenAI, and renders the Word report.
+    `on_stage(stage)` is called before each stage starts,
+    `on_progress(current, total, detail)` reports progress within a stage and
+    `on_metrics(**metrics)` receives counters for the task's metrics.
+    Returns the report path relative to MEDIA_ROOT.
+    """
+    def enter(stage):
+        if on_stage:
+            on_stage(stage)
+
+    def report_metrics(**metrics):
+        if on_metrics:
+            on_metrics(**metrics)
+
+    # The task's own workspace; nothing here is shared with other tasks
+    workspace = task_workspace_path(task.id)
+    directory = task_upload_dir(task.id)
+
+    # Step 1: Fetch audit criteria data
+    enter('fetch')
+    criteria_data = get_criteria_context(task.project_data.get('auditCriteria'))
+
+    if not criteria_data:
+        raise Exception("Failed to fetch criteria data.")
+
+    # Step 2: Process files in the directory
+    enter('process')
+    file_summaries = process_files_in_directory(
+        directory, on_progress=on_progress, file_hashes=load_file_hashes(workspace))
+    if file_summaries:
+        # e.g. boilerplate_tokens_removed={'plan.pdf': 1200, ...}
+        report_metrics(**{
+            name: {file_summary['file_name']: file_summary['stats'][name] for file_summary in file_summaries}
+            for name in file_summaries[0]['stats']
+        })
+
+    # Step 3: Condense the chunks that best match the criteria into evidence notes, in parallel
+    enter('map')
+    # Tokenized once for both BM25 retrieval and the coverage matrix
+    terms = chunk_terms(file_summaries)
+    chunk_ids = retrieve_chunks(file_summaries, criteria_data, terms=terms)
+    # Which chunks support each evidence requirement; the best ones are mapped even if BM25 missed them
+    coverage_chunk_ids, coverage_scores = evidence_coverage(file_summaries, criteria_data, terms)
+    chunk_ids += [
+        chunk_id for chunk_id in covering_chunks(coverage_chunk_ids, coverage_scores)
+        if chunk_id not in chunk_ids
+    ]
+    save_json_file(
+        coverage_report(file_summaries, criteria_data, coverage_chunk_ids, coverage_scores),
+        os.path.join(workspace, 'evidence_coverage.json'),
+    )
+    report_metrics(
+        chunks_total=sum(len(file_summary['chunks']) for file_summary in file_summaries),
+        chunks_retrieved=len(chunk_ids),
+    )
+    notes = map_chunks(
+        file_summaries, criteria_data, on_progress=on_progress, chunk_ids=chunk_ids,
+        coverage=(coverage_chunk_ids, coverage_scores), on_metrics=report_metrics,
+    )
+
+    # Step 4: Merge the notes until they fit the final prompt's budget
+    enter('reduce')
+    evidence_notes = reduce_notes(notes, criteria_data, settings.EVIDENCE_TOKEN_BUDGET, on_progress=on_progress)
+
+    # Step 5: Calculate total points and finalize summaries
+    enter('finalize')
+    total_points = calculate_total_points(criteria_data)
+    final_response = finalize_summaries(
+        total_points, file_summaries, criteria_data, evidence_notes, on_metrics=report_metrics)
+
+    # Save the final response (summary) to a JSON file
+    save_response_as_json(final_response, os.path.join(workspace, 'final_output.json'))
+
+    # Step 6: Generate the audit report (Word document)
+    enter('render')
+    merge_audit_and_project_data(workspace)
+
+    merged_data_path = os.path.join(workspace, 'merged_output.json')
+    with open(merged_data_path, 'r', encoding='utf-8') as merged_file:
+        merged_data = json.load(merged_file)
+    create_word_document(merged_data, os.path.join(workspace, 'generated_audit_report.docx'))
+
+    return task_workspace_relpath(task.id, 'generated_audit_report.docx')
@@ -0,0 +1,52 @@
+# Every prompt is laid out static content first, so consecutive requests share the longest possible
+# prefix and the provider's prompt cache can reuse it: the system message (identical for every call),
+# then the criteria context (identical for every call about the same criteria), then the stage's
+# instructions, and the task's own content (document text, notes) last.
+# Changing anything here changes the prefix of every prompt, so keep it byte-for-byte stable.
+
+SYSTEM_INSTRUCTIONS = """Du er assistent for revisorer som gjennomgår dokumentasjon for BREEAM Infrastruktur-revisjoner.
+Svar alltid på norsk. Bruk bare informasjon fra dokumentene og revisjonskriteriedataene du får, og ikke finn på noe.
+Pek alltid på bevis med kildehenvisning i hakeparentes: dokument og plassering (side, lysbilde eller ark), og kapittel eller avsnitt når det er oppgitt."""
+
+FEW_SHOT_EXAMPLES = """Eksempler på gode beskrivelser av tiltak med kildehenvisning. Ikke kopier dem, ta dem som inspirasjon:
+- Visuell påvirkning i anleggsfasen er inkludert i prosjektets miljøplan (Miljørisikovurdering og Miljøplan SUN01) kapittel 1.3.2, som tar for seg viktigheten av avfallssortering, system for lagring av masser og materialer, i tillegg til generell opprydning etter arbeid.
+- Bane NOR har månedlige kampanje med ulike tema, hvor mai 2023 hadde tema orden og ryddighet. Kampanjene distribueres internt hos Bane NOR og videreføres til entreprenørene. Kampanjen beskriver hvordan materialer og utstyr skal lagres langs jernbanen, støvdempende tiltak, god merking for kildesortering, generell orden og ryddighet (Orden og ryddighet mai 2023)."""
+
+SYSTEM_PROMPT = f"{SYSTEM_INSTRUCTIONS}\n\n{FEW_SHOT_EXAMPLES}"
+
+
+def criteria_context(criteria_data):
+    """
+    The canonical description of a criteria (category, issue, criteria, guidance, evidence
+    and credits) that every prompt about it starts with. Depends only on `criteria_data`.
+    """
+    lines = [
+        "Revisjonskriteriedata:",
+        f"- Kategori: {criteria_data['category']['category_name']} ({criteria_data['category']['category_number']})",
+        f"  Sammendrag: {criteria_data['category']['category_summary']}",
+        f"- Revisjonsspørsmål: {criteria_data['assessment_issue']['issue_name']} ({criteria_data['assessment_issue']['issue_number']})",
+        f"  Mål: {criteria_data['assessment_issue']['aim']}",
+        f"- Vurderingskriterium: {criteria_data['assessment_criteria']['name']}",
+        f"  Beskrivelse: {criteria_data['assessment_criteria']['description']}",
+        "- Veiledning:",
+        *[f"  - {guidance}" for guidance in criteria_data['guidances']],
+        "- Bevis:",
+        *[f"  - {evidence['evidence_guidance']}" for evidence in criteria_data['evidences']],
+        "- Poeng:",
+        *[
+            f"  - {credit['assessment_stage']}: {credit['credits_value']} (Delpoeng: {credit.get('sub_credit_value', 'N/A')})"
+            for credit in criteria_data['credits']
+        ],
+    ]
+    return '\n'.join(lines)
+
+
+def build_messages(criteria_data, instructions, content):
+    """
+    Chat messages for one request: the system prompt, then the criteria context, the
+    stage's `instructions` and the task's `content`, in that order.
+    """
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': f"{criteria_context(criteria_data)}\n\n{instructions}\n\n{content}"},
+    ]
@@ -0,0 +1,65 @@
+from django.conf import settings
+from .chunker import count_tokens
+from .retrieval import BM25Index
+
+
+def final_max_tokens(document_count):
+    """
+    max_tokens for the final answer: FINAL_OUTPUT_BASE_TOKENS for the JSON frame and the
+    points, plus FINAL_OUTPUT_TOKENS_PER_DOCUMENT for each document's compliance summary
+    and attachment description, capped at FINAL_OUTPUT_MAX_TOKENS.
+    """
+    return min(
+        settings.FINAL_OUTPUT_MAX_TOKENS,
+        settings.FINAL_OUTPUT_BASE_TOKENS + document_count * settings.FINAL_OUTPUT_TOKENS_PER_DOCUMENT,
+    )
+
+
+def rank_by_relevance(items, query):
+    """
+    Indexes of `items` ordered by BM25 relevance to `query`, best first; items without a
+    query term follow in their original order.
+    """
+    index = BM25Index(items)
+    ranked = [item for _, item in index.search(query, len(items))]
+    matched = set(ranked)
+    return ranked + [item for item in range(len(items)) if item not in matched]
+
+
+def pack_prompt(sections, budget, query):
+    """
+    Builds a prompt of at most `budget` tokens from `sections`, (name, content) pairs in
+    prompt order. A str content is always included. A list content holds optional lines
+    (e.g. evidence notes): they are added in order of relevance to `query` while the
+    budget lasts, and written in their original order.
+
+    Returns the prompt, the tokens used per section and the dropped lines per section.
+    """
+    used = {name: count_tokens(content) for name, content in sections if isinstance(content, str)}
+    remaining = budget - sum(used.values())
+    if remaining < 0:
+        print(f"Required prompt sections take {budget - remaining} tokens, over the budget of {budget}")
+
+    kept = {}
+    dropped = {}
+    for name, content in sections:
+        if isinstance(content, str):
+            continue
+        used[name] = 0
+        kept[name] = set()
+        for item in rank_by_relevance(content, query):
+            # +1 for the newline after the line
+            tokens = count_tokens(content[item]) + 1
+            if tokens <= remaining:
+                kept[name].add(item)
+                used[name] += tokens
+                remaining -= tokens
+        dropped[name] = [line for item, line in enumerate(content) if item not in kept[name]]
+
+    parts = []
+    for name, content in sections:
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.append(''.join(f"{line}\n" for item, line in enumerate(content) if item in kept[name]))
+    return ''.join(parts), used, dropped
@@ -0,0 +1,171 @@
+import math
+import re
+from collections import Counter
+from functools import lru_cache
+from django.conf import settings
+
+_WORD = re.compile(r'[^\W\d_]+')
+_VOWELS = set('aeiouyæøå')
+
+STOPWORDS = frozenset('''
+alle andre at av bare begge ble blei bli blir blitt både da dag de deg dei deira deires dem den denne der dere
+deres det dette di din disse ditt du dykk dykkar då eg ein eit eitt eller elles en ene eneste enhver enn er et ett
+etter for fordi fra før ha hadde han hans har hennar henne hennes her hjå ho hoe honom hoss hossen hun hva hvem
+hver hvilke hvilken hvis hvor hvordan hvorfor i ikke ikkje ingen ingi inkje inn inni ja jeg kan kom korleis korso
+kun kunne kva kvar kvarhelst kven kvi kvifor man mange me med medan meg meget mellom men mi min mine mitt mot
+mykje må måtte ned no noe noen noka noko nokon nokor nokre nå når og også om opp oss over på samme seg selv si
+sia sidan siden sin sine sitt sjøl skal skulle slik so som somme somt så sånn til um upp ut uten var vart varte
+ved vere verte vi vil ville vore vors vort vår være vært å
+'''.split())
+
+# Snowball Norwegian stemmer suffixes, longest first
+_STEP1_SUFFIXES = sorted('''
+a e ede ande ende ane ene hetene en heten ar er heter as es edes endes enes hetenes ens hetens ers ets et het ast
+erte ert s
+'''.split(), key=len, reverse=True)
+_STEP3_SUFFIXES = sorted('leg eleg ig eig lig elig els lov elov slov hetslov'.split(), key=len, reverse=True)
+_S_ENDINGS = set('bcdfghjlmnoprtvyz')
+
+
+def _r1(word):
+    """
+    Start of the Snowball R1 region: after the first non-vowel that follows a vowel, and
+    at least 3 letters in.
+    """
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return max(i + 1, 3)
+    return len(word)
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """
+    Norwegian (bokmål) Snowball stemmer: 'avfallet', 'avfall' -> 'avfall';
+    'sorteringen', 'sorteringer' -> 'sortering'.
+    """
+    r1 = _r1(word)
+    suffix = next((suffix for suffix in _STEP1_SUFFIXES if word.endswith(suffix) and len(word) - len(suffix) >= r1), '')
+    if suffix in ('erte', 'ert'):
+        word = word[:-len(suffix)] + 'er'
+    elif suffix == 's':
+        # Only after a valid s-ending
+        if word[-2] in _S_ENDINGS or (word[-2] == 'k' and len(word) > 2 and word[-3] not in _VOWELS):
+            word = word[:-1]
+    elif suffix:
+        word = word[:-len(suffix)]
+
+    if word.endswith(('dt', 'vt')) and len(word) - 2 >= r1:
+        word = word[:-1]
+
+    for suffix in _STEP3_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            word = word[:-len(suffix)]
+            break
+    return word
+
+
+def tokenize(text):
+    """
+    Lower-cased, stemmed words of `text` without stop words and single letters.
+    """
+    return [
+        stem(word) for word in _WORD.findall(text.lower())
+        if len(word) > 1 and word not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    In-memory inverted index over a list of passages, scored with Okapi BM25
+    (parameters BM25_K1 and BM25_B). `terms` are the passages' terms if they are already
+    tokenized (see chunk_terms).
+    """
+
+    def __init__(self, passages, terms=None):
+        self.postings = {}  # term -> [(passage index, term frequency)]
+        self.lengths = []
+        for index, passage_terms in enumerate(map(tokenize, passages) if terms is None else terms):
+            self.lengths.append(len(passage_terms))
+            for term, frequency in Counter(passage_terms).items():
+                self.postings.setdefault(term, []).append((index, frequency))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def scores(self, query):
+        """
+        Returns the BM25 score of every passage for the terms of `query` (a repeated term
+        counts once per repetition).
+        """
+        k1, b = settings.BM25_K1, settings.BM25_B
+        scores = [0.0] * len(self)
+        for term, query_frequency in Counter(tokenize(query)).items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (len(self) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, frequency in postings:
+                norm = k1 * (1 - b + b * self.lengths[index] / self.average_length)
+                scores[index] += query_frequency * idf * frequency * (k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query, top_k):
+        """
+        Returns up to `top_k` (score, passage index) pairs that match `query`, best first.
+        """
+        scores = self.scores(query)
+        ranked = sorted(((score, index) for index, score in enumerate(scores) if score > 0), reverse=True)
+        return ranked[:top_k]
+
+
+def criteria_query(criteria_data):
+    """
+    The retrieval query for a criteria: its description, guidance and evidence guidance.
+    """
+    return '\n'.join([
+        criteria_data['assessment_criteria']['description'] or '',
+        *criteria_data['guidances'],
+        *[evidence['evidence_guidance'] for evidence in criteria_data['evidences']],
+    ])
+
+
+def chunk_passages(file_summaries):
+    """
+    Returns the (file index, chunk index) pairs of every chunk of every file, in document
+    order, and the text of each chunk.
+    """
+    chunk_ids = []
+    passages = []
+    for file_index, file_summary in enumerate(file_summaries):
+        for chunk_index, (start, end) in enumerate(file_summary['chunks']):
+            chunk_ids.append((file_index, chunk_index))
+            passages.append(file_summary['document'].text[start:end])
+    return chunk_ids, passages
+
+
+def chunk_terms(file_summaries):
+    """
+    The terms (see tokenize) of every chunk of every file, in chunk_passages order, to
+    tokenize the chunks once for both retrieve_chunks and coverage.evidence_coverage.
+    """
+    return [tokenize(passage) for passage in chunk_passages(file_summaries)[1]]
+
+
+def retrieve_chunks(file_summaries, criteria_data, top_k=None, terms=None):
+    """
+    Ranks every chunk of every file against the criteria with BM25 and returns the
+    (file index, chunk index) pairs of the RETRIEVAL_TOP_K best matching chunks, best first.
+    Chunks without a single query term are never returned. With RETRIEVAL_TOP_K = 0 all
+    chunks are returned: the matching ones best first, then the others in document order.
+    `terms` are the chunks' terms from chunk_terms, if already computed.
+    """
+    top_k = settings.RETRIEVAL_TOP_K if top_k is None else top_k
+    chunk_ids, passages = chunk_passages(file_summaries)
+    index = BM25Index(passages, terms)
+    ranked = [passage for _, passage in index.search(criteria_query(criteria_data), top_k or len(index))]
+    if not top_k:
+        matched = set(ranked)
+        ranked += [passage for passage in range(len(index)) if passage not in matched]
+    return [chunk_ids[passage] for passage in ranked]
@@ -0,0 +1,144 @@
+import numpy as np
+from django.conf import settings
+from .ai_integration import generate_summaries
+from .chunker import chunk_text, count_tokens
+from .prompt_layout import build_messages
+
+# Answer the map stage gives when a chunk holds nothing relevant to the criteria
+NO_EVIDENCE_MARKER = 'INGEN RELEVANTE FUNN'
+
+
+MAP_INSTRUCTIONS = f"""Oppgave: skriv korte bevisnotater på norsk om tiltak, krav eller dokumentasjon i teksten nedenfor som er relevante for kriteriet over.
+Hvert notat skal være én linje som starter med "- " og slutter med kildehenvisning i formatet [dokument, plassering, kapittel/avsnitt/side hvis oppgitt i teksten], med dokument og plassering som oppgitt nedenfor.
+Ikke finn på noe som ikke står i teksten. Hvis teksten ikke inneholder noe relevant, svar kun: {NO_EVIDENCE_MARKER}"""
+
+REDUCE_INSTRUCTIONS = """Oppgave: slå sammen bevisnotatene nedenfor til en kortere liste på norsk. Fjern gjentakelser og det som ikke er relevant for kriteriet,
+men behold alle konkrete tiltak og alle kildehenvisninger i hakeparentes. Hver linje starter med "- "."""
+
+
+def build_map_prompt(criteria_data, file_name, location, chunk):
+    return build_messages(criteria_data, MAP_INSTRUCTIONS, f"""Dokument: {file_name}
+Plassering: {location}
+
+Tekst:
+{chunk}""")
+
+
+def build_reduce_prompt(criteria_data, notes_text):
+    return build_messages(criteria_data, REDUCE_INSTRUCTIONS, f"""Notater:
+{notes_text}""")
+
+
+def map_chunks(file_summaries, criteria_data, on_progress=None, chunk_ids=None, coverage=None, on_metrics=None):
+    """
+    Map stage: condenses chunks into criteria-relevant evidence notes, LLM_MAX_CONCURRENCY
+    chunks at a time in the order of `chunk_ids`, the (file index, chunk index) pairs to
+    map, most relevant first (e.g. from retrieval.retrieve_chunks); all chunks by default.
+
+    `coverage` is the (chunk ids, scores) pair from coverage.evidence_coverage. With it,
+    mapping stops early once every evidence requirement has notes from a chunk scoring at
+    least COVERAGE_STOP_SCORE for it, and the remaining chunks are skipped.
+    `on_metrics(map_calls=..., map_calls_skipped=...)` receives the counts.
+    Returns one notes string per chunk that had relevant content, in document order.
+    """
+    if chunk_ids is None:
+        chunk_ids = [
+            (file_index, i)
+            for file_index, file_summary in enumerate(file_summaries)
+            for i in range(len(file_summary['chunks']))
+        ]
+
+    # chunk id -> which requirements notes from that chunk count as covering
+    supports = {}
+    covered = None
+    if coverage and settings.COVERAGE_STOP_SCORE and len(criteria_data['evidences']):
+        coverage_chunk_ids, scores = coverage
+        supports = dict(zip(coverage_chunk_ids, scores >= settings.COVERAGE_STOP_SCORE))
+        covered = np.zeros(len(criteria_data['evidences']), dtype=bool)
+
+    notes = []
+    mapped = 0
+    while mapped < len(chunk_ids) and (covered is None or not covered.all()):
+        batch = chunk_ids[mapped:mapped + max(1, settings.LLM_MAX_CONCURRENCY)]
+        prompts = []
+        labels = []
+        for file_index, i in batch:
+            file_name = file_summaries[file_index]['file_name']
+            document = file_summaries[file_index]['document']
+            chunks = file_summaries[file_index]['chunks']
+            start, end = chunks[i]
+            location = ', '.join(filter(None, [document.location(start, end), f"del {i + 1} av {len(chunks)}"]))
+            prompts.append(build_map_prompt(criteria_data, file_name, location, document.render(start, end)))
+            labels.append(f"chunk {i + 1}/{len(chunks)} of {file_name}")
+
+        def report(done, total, index):
+            if on_progress:
+                on_progress(mapped + done, len(chunk_ids), labels[index])
+
+        responses = generate_summaries(prompts, max_tokens=settings.MAP_MAX_TOKENS, on_result=report)
+        for chunk_id, response in zip(batch, responses):
+            if response and NO_EVIDENCE_MARKER not in response:
+                notes.append((chunk_id, response.strip()))
+                if chunk_id in supports:
+                    covered |= supports[chunk_id]
+        mapped += len(batch)
+
+    if on_metrics:
+        on_metrics(map_calls=mapped, map_calls_skipped=len(chunk_ids) - mapped)
+    return [response for _, response in sorted(notes)]
+
+
+def _batch_notes(notes, batch_tokens):
+    """
+    Groups consecutive notes into batches of at most `batch_tokens` tokens each.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for note in notes:
+        note_tokens = count_tokens(note)
+        if current and current_tokens + note_tokens > batch_tokens:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(note)
+        current_tokens += note_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def reduce_notes(notes, criteria_data, token_budget, on_progress=None):
+    """
+    Reduce stage: merges evidence notes batch by batch, round after round, until they
+    fit in `token_budget` tokens. Returns the notes as a single string.
+    """
+    rounds = 0
+    while sum(map(count_tokens, notes)) > token_budget and rounds < settings.MAX_REDUCE_ROUNDS:
+        rounds += 1
+        batches = _batch_notes(notes, settings.REDUCE_BATCH_TOKENS)
+
+        def report(done, total, index):
+            if on_progress:
+                on_progress(done, total, f"round {rounds}: batch {done}/{total}")
+
+        responses = generate_summaries(
+            [build_reduce_prompt(criteria_data, '\n'.join(batch)) for batch in batches],
+            max_tokens=settings.REDUCE_MAX_TOKENS,
+            on_result=report,
+        )
+        # Keep the original notes of any batch whose reduce call failed
+        reduced = [
+            response.strip() if response else '\n'.join(batch)
+            for batch, response in zip(batches, responses)
+        ]
+        shrunk = sum(map(count_tokens, reduced)) < sum(map(count_tokens, notes))
+        notes = reduced
+        if not shrunk:
+            break
+
+    text = '\n'.join(notes)
+    if count_tokens(text) > token_budget:
+        # Last resort: cut at a sentence boundary within the budget rather than overflow the final prompt
+        text = next(chunk_text(text, max_tokens=token_budget, overlap_tokens=0), '')
+    return text
@@ -0,0 +1,117 @@
+import re
+from collections import Counter
+from django.conf import settings
+from .chunker import count_tokens
+from .documents import TABLE_CELL_SEPARATOR, TABLE_ROW, DocumentBuilder, split_cells
+
+_NUMBER = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+
+
+def parse_number(value):
+    """
+    Parses cell values such as '12 345,6', '1234.5' or '87 %'; returns None for anything else.
+    """
+    value = value.replace('\xa0', '').replace(' ', '').rstrip('%')
+    if not _NUMBER.fullmatch(value):
+        return None
+    return float(value.replace(',', '.'))
+
+
+def _format_number(number):
+    return f"{number:.2f}".rstrip('0').rstrip('.')
+
+
+def _iter_tables(document):
+    """
+    Yields (first, last) span indexes of every table: a run of consecutive table rows with
+    the same locator and heading path. Other spans are yielded as (i, i).
+    """
+    index = 0
+    while index < len(document):
+        last = index
+        if document.kinds[index] == TABLE_ROW:
+            while (last + 1 < len(document)
+                   and document.kinds[last + 1] == TABLE_ROW
+                   and document.locator_ids[last + 1] == document.locator_ids[index]
+                   and document.heading_ids[last + 1] == document.heading_ids[index]):
+                last += 1
+        yield index, last
+        index = last + 1
+
+
+def summarize_table(rows):
+    """
+    Encodes a large table with numeric columns as per-column statistics plus the header and a
+    sample of TABLE_SAMPLE_ROWS rows. The first row is taken as the header.
+    """
+    header, body = rows[0], rows[1:]
+    # Rows may be ragged (spreadsheets drop trailing empty cells)
+    header = header + [''] * (max(map(len, body)) - len(header))
+    lines = [f"Tabell med {len(body)} rader og {len(header)} kolonner, oppsummert per kolonne:"]
+    for column, name in enumerate(header):
+        values = [row[column] for row in body if column < len(row) and row[column]]
+        numbers = [number for number in map(parse_number, values) if number is not None]
+        name = name or f"Kolonne {column + 1}"
+        if values and len(numbers) >= len(values) * settings.TABLE_NUMERIC_RATIO:
+            lines.append(
+                f"- {name}: {len(numbers)} tall, min {_format_number(min(numbers))}, "
+                f"maks {_format_number(max(numbers))}, snitt {_format_number(sum(numbers) / len(numbers))}, "
+                f"sum {_format_number(sum(numbers))}"
+            )
+        elif values:
+            common = Counter(values).most_common(3)
+            lines.append(
+                f"- {name}: {len(values)} verdier, {len(set(values))} unike, vanligst: "
+                + ', '.join(f"{value} ({count})" for value, count in common)
+            )
+        else:
+            lines.append(f"- {name}: tom")
+    lines.append("Utvalg av rader:")
+    lines.append(TABLE_CELL_SEPARATOR.join(header))
+    step = max(1, len(body) // settings.TABLE_SAMPLE_ROWS)
+    lines.extend(TABLE_CELL_SEPARATOR.join(row) for row in body[::step][:settings.TABLE_SAMPLE_ROWS])
+    return '\n'.join(lines)
+
+
+def _has_numeric_column(rows):
+    """
+    True when at least TABLE_NUMERIC_RATIO of the values in some column are numbers.
+    """
+    for column in range(max(map(len, rows))):
+        values = [row[column] for row in rows[1:] if column < len(row) and row[column]]
+        numbers = sum(parse_number(value) is not None for value in values)
+        if values and numbers >= len(values) * settings.TABLE_NUMERIC_RATIO:
+            return True
+    return False
+
+
+def encode_tables(document):
+    """
+    Returns a copy of `document` where every table with more than TABLE_SUMMARY_MIN_ROWS
+    rows and at least one numeric column (quantity lists, waste tracking) is replaced by
+    summarize_table, and the number of tokens saved. Smaller and purely textual tables
+    (evidence matrices) keep their rows: one delimited line per row, with the header
+    as the first row (Document.render repeats it for chunks that start mid-table).
+    """
+    builder = DocumentBuilder(document.file_name)
+    tokens_before = tokens_after = 0
+
+    for first, last in _iter_tables(document):
+        rows = None
+        if last - first + 1 > settings.TABLE_SUMMARY_MIN_ROWS:
+            rows = [split_cells(document.span_text(index)) for index in range(first, last + 1)]
+        if rows is None or not _has_numeric_column(rows):
+            for index in range(first, last + 1):
+                span = document.span(index)
+                builder.add(document.span_text(index), span.locator, span.heading_path, span.kind)
+            continue
+
+        span = document.span(first)
+        summary = summarize_table(rows)
+        tokens_before += count_tokens(document.text[document.starts[first]:document.ends[last]])
+        tokens_after += count_tokens(summary)
+        builder.add(summary, span.locator, span.heading_path, TABLE_ROW)
+
+    if not tokens_before:
+        return document, 0
+    return builder.build(), tokens_before - tokens_after
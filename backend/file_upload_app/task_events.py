@@ -0,0 +1,76 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from .models import ProcessingTask
+
+
+def _progress_key(task):
+    return (task.status, task.stage, task.progress_current, task.progress_total, task.progress_detail)
+
+
+class TaskEventHub:
+    """
+    Fans task updates out to every event stream in this process.
+
+    A single poller looks up all watched tasks with one query per interval, so the
+    database load does not grow with the number of open streams. Subscribers
+    receive the task whenever its status, stage or progress changes, and None
+    if the task no longer exists.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._last_keys = {}
+        self._poller = None
+
+    def subscribe(self, task_id):
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(task_id, set()).add(queue)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        return queue
+
+    def unsubscribe(self, task_id, queue):
+        queues = self._subscribers.get(task_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[task_id]
+            self._last_keys.pop(task_id, None)
+
+    @staticmethod
+    def _fetch(task_ids):
+        # Runs in a long-lived thread outside the request cycle, so drop broken or expired
+        # (CONN_MAX_AGE) connections around the query the way Django does around a request
+        close_old_connections()
+        try:
+            tasks = ProcessingTask.objects.filter(pk__in=task_ids).defer('project_data')
+            return {task.pk: task for task in tasks}
+        finally:
+            close_old_connections()
+
+    async def _poll(self):
+        while self._subscribers:
+            task_ids = list(self._subscribers)
+            try:
+                tasks = await sync_to_async(self._fetch)(task_ids)
+            except Exception as e:
+                print(f"Task event poll failed: {e}")
+                tasks = None
+
+            if tasks is not None:
+                for task_id in task_ids:
+                    task = tasks.get(task_id)
+                    key = _progress_key(task) if task else None
+                    if task_id in self._last_keys and self._last_keys[task_id] == key:
+                        continue
+                    self._last_keys[task_id] = key
+                    for queue in self._subscribers.get(task_id, ()):
+                        queue.put_nowait(task)
+
+            await asyncio.sleep(settings.TASK_EVENTS_POLL_INTERVAL)
+
+
+task_event_hub = TaskEventHub()
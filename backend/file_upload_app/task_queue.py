@@ -0,0 +1,167 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import ProcessingTask
+from .workspace import remove_task_workspace
+
+
+def enqueue_task(project_data, task_id=None):
+    """
+    Stores a new task in the queue and returns it. The task is picked up by a
+    `process_tasks` worker; the caller does not wait for it.
+    Pass `task_id` when the task's workspace was created before queueing.
+    """
+    if task_id is None:
+        return ProcessingTask.objects.create(project_data=project_data)
+    return ProcessingTask.objects.create(id=task_id, project_data=project_data)
+
+
+def claim_next_task(worker_name):
+    """
+    Claims the oldest runnable task for this worker, or returns None if the queue is empty.
+
+    Rows are locked with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+    can poll concurrently without blocking each other or claiming the same task.
+    Tasks whose worker stopped sending heartbeats are claimed again until
+    TASK_MAX_ATTEMPTS is reached.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.TASK_LEASE_TIMEOUT)
+
+    with transaction.atomic():
+        task = (
+            ProcessingTask.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ProcessingTask.STATUS_QUEUED) |
+                Q(status=ProcessingTask.STATUS_PROCESSING, heartbeat_at__lt=stale_before)
+            )
+            .filter(attempts__lt=settings.TASK_MAX_ATTEMPTS)
+            .order_by('created_at')
+            .first()
+        )
+        if task is None:
+            return None
+
+        task.status = ProcessingTask.STATUS_PROCESSING
+        task.worker = worker_name
+        task.attempts += 1
+        task.started_at = now
+        task.heartbeat_at = now
+        # A re-claimed task starts over, so drop stage data from the abandoned attempt
+        task.stage = ''
+        task.stage_started_at = None
+        task.stage_timings = {}
+        task.metrics = {}
+        task.save(update_fields=[
+            'status', 'worker', 'attempts', 'started_at', 'heartbeat_at',
+            'stage', 'stage_started_at', 'stage_timings', 'metrics',
+        ])
+        return task
+
+
+def _close_stage(task, now):
+    """
+    Records the time spent in the task's current stage, if any.
+    """
+    if task.stage and task.stage_started_at:
+        elapsed = (now - task.stage_started_at).total_seconds()
+        task.stage_timings = {**task.stage_timings, task.stage: round(elapsed, 3)}
+
+
+def set_stage(task, stage):
+    """
+    Moves a task to the given pipeline stage, recording how long the previous stage took.
+    Also renews the worker's lease.
+    """
+    now = timezone.now()
+    _close_stage(task, now)
+    task.stage = stage
+    task.stage_started_at = now
+    task.progress_current = 0
+    task.progress_total = 0
+    task.progress_detail = ''
+    task.heartbeat_at = now
+    task.save(update_fields=[
+        'stage', 'stage_started_at', 'stage_timings',
+        'progress_current', 'progress_total', 'progress_detail', 'heartbeat_at',
+    ])
+
+
+def set_progress(task, current, total, detail=''):
+    """
+    Records progress within the current stage, e.g. set_progress(task, 14, 52, "chunk 14/52 of report.pdf").
+    Also renews the worker's lease.
+    """
+    task.progress_current = current
+    task.progress_total = total
+    task.progress_detail = detail[:255]
+    task.heartbeat_at = timezone.now()
+    task.save(update_fields=['progress_current', 'progress_total', 'progress_detail', 'heartbeat_at'])
+
+
+def record_metrics(task, **metrics):
+    """
+    Adds counters to the task's metrics, e.g. record_metrics(task, llm_cache_hits=12).
+    """
+    task.metrics = {**task.metrics, **metrics}
+    task.save(update_fields=['metrics'])
+
+
+def _finish(task, status, **fields):
+    now = timezone.now()
+    _close_stage(task, now)
+    task.status = status
+    task.finished_at = now
+    task.expires_at = now + timedelta(seconds=settings.TASK_RESULT_TTL)
+    for name, value in fields.items():
+        setattr(task, name, value)
+    task.save(update_fields=['status', 'stage_timings', 'finished_at', 'expires_at', *fields])
+
+
+def complete_task(task, output_file):
+    """
+    Marks a task as completed. `output_file` is the report path relative to MEDIA_ROOT.
+    """
+    _finish(task, ProcessingTask.STATUS_COMPLETED, output_file=output_file)
+
+
+def fail_task(task, message):
+    """
+    Marks a task as failed with the given error message.
+    """
+    _finish(task, ProcessingTask.STATUS_ERROR, message=message)
+
+
+def fail_exhausted_tasks():
+    """
+    Marks abandoned tasks that have used up all attempts as failed, so they do not
+    stay in 'processing' forever. Returns the number of tasks updated.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.TASK_LEASE_TIMEOUT)
+    return ProcessingTask.objects.filter(
+        status=ProcessingTask.STATUS_PROCESSING,
+        heartbeat_at__lt=stale_before,
+        attempts__gte=settings.TASK_MAX_ATTEMPTS,
+    ).update(
+        status=ProcessingTask.STATUS_ERROR,
+        message='Task was abandoned by its worker too many times',
+        finished_at=now,
+        expires_at=now + timedelta(seconds=settings.TASK_RESULT_TTL),
+    )
+
+
+def purge_expired_tasks():
+    """
+    Deletes finished tasks whose TTL has passed, together with their workspaces.
+    Returns the number of tasks deleted.
+    """
+    expired = ProcessingTask.objects.filter(expires_at__lt=timezone.now())
+    expired_ids = list(expired.values_list('id', flat=True))
+    for task_id in expired_ids:
+        remove_task_workspace(task_id)
+    deleted, _ = ProcessingTask.objects.filter(id__in=expired_ids).delete()
+    return deleted
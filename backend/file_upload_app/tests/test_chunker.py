@@ -0,0 +1,17 @@
+from django.test import SimpleTestCase
+from file_upload_app.chunker import chunk_text, count_tokens
+
+
+class ChunkTextTests(SimpleTestCase):
+    def test_run_without_whitespace_is_cut_to_max_tokens(self):
+        chunks = list(chunk_text('x' * 5000, 100, 0))
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(max(count_tokens(chunk) for chunk in chunks), 100)
+        self.assertEqual(''.join(chunks), 'x' * 5000)
+
+    def test_long_run_inside_a_sentence_keeps_the_words_around_it(self):
+        text = 'Se vedlegg ' + 'a' * 2000 + ' for detaljer'
+        chunks = list(chunk_text(text, 50, 0))
+        self.assertLessEqual(max(count_tokens(chunk) for chunk in chunks), 50)
+        self.assertTrue(chunks[0].startswith('Se vedlegg'))
+        self.assertTrue(chunks[-1].endswith('for detaljer'))
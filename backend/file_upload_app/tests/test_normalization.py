@@ -0,0 +1,33 @@
+from django.test import SimpleTestCase, override_settings
+from file_upload_app.documents import DocumentBuilder
+from file_upload_app.normalization import strip_boilerplate
+
+
+@override_settings(BOILERPLATE_MIN_PAGES=3, BOILERPLATE_PAGE_RATIO=0.5)
+class StripBoilerplateTests(SimpleTestCase):
+    def build(self, pages):
+        builder = DocumentBuilder('rapport.pdf')
+        for page_number, text in enumerate(pages, 1):
+            builder.add(text, f"Side {page_number}")
+        return builder.build()
+
+    def test_lines_that_differ_only_in_their_numbers_are_kept(self):
+        pages = [
+            f"Avfall levert i uke {week}: {week * 3} tonn\nSorteringsgrad {80 + week} %\nTiltak {week}: sortering på byggeplass"
+            for week in range(1, 9)
+        ]
+        document, removed_tokens = strip_boilerplate(self.build(pages))
+        self.assertEqual(removed_tokens, 0)
+        self.assertEqual(document.text, self.build(pages).text)
+
+    def test_header_and_footer_with_page_numbers_and_dates_are_kept_once(self):
+        pages = [
+            f"Miljøplan SUN01 – revidert {page}.0{page}.2024\nTiltak {page}: sortering på byggeplass\nSide {page} av 8"
+            for page in range(1, 9)
+        ]
+        document, removed_tokens = strip_boilerplate(self.build(pages))
+        self.assertGreater(removed_tokens, 0)
+        self.assertEqual(document.text.count('Miljøplan SUN01'), 1)
+        self.assertEqual(document.text.count('av 8'), 1)
+        for page in range(1, 9):
+            self.assertIn(f"Tiltak {page}: sortering på byggeplass", document.text)
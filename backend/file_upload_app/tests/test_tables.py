@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase, override_settings
+from file_upload_app.chunker import chunk_document
+from file_upload_app.documents import TABLE_ROW, DocumentBuilder, join_cells, split_cells
+from file_upload_app.tables import encode_tables
+
+
+class CellsTests(SimpleTestCase):
+    def test_edge_empty_cells_survive_the_builder(self):
+        builder = DocumentBuilder('liste.xlsx')
+        builder.add(join_cells(['', 'A0', '0', '']), 'Ark: Avfall', kind=TABLE_ROW)
+        document = builder.build()
+        self.assertEqual(split_cells(document.span_text(0)), ['', 'A0', '0', ''])
+
+    def test_separator_inside_a_cell_does_not_split_it(self):
+        self.assertEqual(split_cells(join_cells(['a | b', 'c\nd'])), ['a ¦ b', 'c d'])
+
+    def test_all_empty_row_is_skipped(self):
+        builder = DocumentBuilder('liste.xlsx')
+        builder.add(join_cells(['', '', '']), 'Ark: Avfall', kind=TABLE_ROW)
+        self.assertEqual(len(builder.build()), 0)
+
+
+@override_settings(TABLE_SUMMARY_MIN_ROWS=30, TABLE_NUMERIC_RATIO=0.5, TABLE_SAMPLE_ROWS=5)
+class EncodeTablesTests(SimpleTestCase):
+    def build(self, rows):
+        builder = DocumentBuilder('liste.xlsx')
+        for row in rows:
+            builder.add(join_cells(row), 'Ark: Avfall', kind=TABLE_ROW)
+        return builder.build()
+
+    def test_table_with_empty_first_column_is_summarized(self):
+        rows = [['', 'Fraksjon', 'Mengde']] + [['', f'A{i}', str(i)] for i in range(40)]
+        document, tokens_saved = encode_tables(self.build(rows))
+        self.assertEqual(len(document), 1)
+        self.assertGreater(tokens_saved, 0)
+        self.assertIn('Tabell med 40 rader og 3 kolonner', document.text)
+        self.assertIn('- Mengde: 40 tall, min 0, maks 39', document.text)
+
+    def test_ragged_rows_are_summarized(self):
+        # Spreadsheets drop trailing empty cells, so rows can be shorter than the header
+        rows = [['Fraksjon', 'Mengde', 'Kommentar']] + [
+            [f'A{i}', str(i)] + (['ok'] if i % 2 else []) for i in range(40)
+        ]
+        document, _ = encode_tables(self.build(rows))
+        self.assertIn('- Mengde: 40 tall', document.text)
+        self.assertIn('- Kommentar: 20 verdier', document.text)
+
+    def test_small_table_keeps_its_rows(self):
+        rows = [['', 'Fraksjon', 'Mengde', '']] + [['', f'A{i}', str(i), ''] for i in range(5)]
+        document, tokens_saved = encode_tables(self.build(rows))
+        self.assertEqual(tokens_saved, 0)
+        self.assertEqual(split_cells(document.span_text(1)), ['', 'A0', '0', ''])
+
+    def test_chunks_starting_mid_table_repeat_the_header(self):
+        rows = [['Tiltak', 'Ansvarlig', 'Status']] + [
+            [f'Sortering av avfall på rigg {i}', 'Entreprenør', 'Utført'] for i in range(20)
+        ]
+        builder = DocumentBuilder('matrise.docx')
+        builder.add('Innledning til evidensmatrisen.', 'Side 1')
+        for row in rows:
+            builder.add(join_cells(row), 'Side 1', kind=TABLE_ROW)
+        document, _ = encode_tables(builder.build())
+
+        chunks = chunk_document(document, max_tokens=60, overlap_tokens=0)
+        self.assertGreater(len(chunks), 2)
+        for start, end in chunks[1:]:
+            lines = document.render(start, end).split('\n')
+            self.assertEqual(lines[:2], ['[Side 1]', 'Tiltak | Ansvarlig | Status'])
+        self.assertEqual(document.render(*chunks[0]).count('Tiltak | Ansvarlig | Status'), 1)
@@ -13,4 +13,5 @@ urlpatterns = [
     path('upload/', views.upload_data_and_files, name='upload_data_and_files'),
     path('process-criteria-data/', views.process_criteria_data, name='process_criteria_data'),
     path('task-status/<str:task_id>/', views.check_task_status, name='check_task_status'),
+    path('task-events/<str:task_id>/', views.task_events, name='task_events'),
 ]
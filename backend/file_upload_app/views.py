@@ -4,7 +4,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 import json
 import os
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+import asyncio
 from .database_service import (
     get_db_connection,
     get_all_assessment_criteria,
@@ -16,23 +17,15 @@ from .database_service import (
     get_prerequisites_for_audit_criteria,
     get_category_weighting_for_audit_criteria,
     get_assessment_criteria_credits,
-    get_comprehensive_criteria_data,
 )
-from .generate_report import create_word_document, gather_data
+from .criteria_context import get_criteria_context
+from .file_extractors import save_uploaded_file
+from django.core.exceptions import ValidationError
+from .models import ProcessingTask
+from .task_queue import enqueue_task
+from .task_events import task_event_hub
+from .workspace import create_task_workspace, task_upload_dir, task_workspace_path
 import uuid
-import time
-from .ai_integration import (
-    fetch_audit_criteria_data,
-    initialize_audit_criteria,
-    process_files_in_directory,
-    send_file_chunks,
-    calculate_total_points,
-    finalize_summaries,
-    save_response_as_json,
-)
-from .create_json_file import merge_audit_and_project_data
-
-task_statuses = {}
 
 @api_view(['GET'])
 def audit_criteria_list(request):
@@ -92,12 +85,12 @@ def upload_data_and_files(request):
             # Attempt to load the JSON data
             data = json.loads(request.POST.get('data'))
 
-            # Ensure the MEDIA_ROOT directory exists
-            if not os.path.exists(settings.MEDIA_ROOT):
-                os.makedirs(settings.MEDIA_ROOT)
+            # Every task gets its own workspace, so jobs only ever see their own files
+            task_id = uuid.uuid4()
+            workspace = create_task_workspace(task_id)
 
             # Define the path for the 'data.json' file
-            json_file_path = os.path.join(settings.MEDIA_ROOT, 'data.json')
+            json_file_path = os.path.join(workspace, 'data.json')
 
             # Open the file in write mode, 'w' will create the file if it does not exist
             with open(json_file_path, 'w') as json_file:
@@ -105,76 +98,21 @@ def upload_data_and_files(request):
 
             # Handle file uploads
             files = request.FILES.getlist('file')
-            upload_dir = os.path.join(settings.MEDIA_ROOT, 'uploads')
-
-            # Ensure the upload directory exists
-            if not os.path.exists(upload_dir):
-                os.makedirs(upload_dir)
+            upload_dir = task_upload_dir(task_id)
 
-            # Save each file
+            # Save each file, hashing it on the way so the worker can reuse earlier extractions of the same content
+            file_hashes = {}
             for file in files:
-                file_path = os.path.join(upload_dir, file.name)
-                with open(file_path, 'wb+') as destination:
-                    for chunk in file.chunks():
-                        destination.write(chunk)
-
-            # Generate a unique task ID
-            task_id = str(uuid.uuid4())
-
-            # Simulate background task by setting the task status to 'processing'
-            task_statuses[task_id] = {'status': 'processing'}
-
-            # === OpenAI Processing Start ===
-            # You can trigger the OpenAI workflow here
-            try:
-                # Path to the directory containing files
-                directory = os.path.join(settings.MEDIA_ROOT, 'uploads')
-
-                # Step 1: Fetch audit criteria data from the API
-                criteria_data = fetch_audit_criteria_data()
-
-                if not criteria_data:
-                    raise Exception("Failed to fetch criteria data.")
-
-                # Step 2: Initialize OpenAI with criteria context
-                initialize_audit_criteria(criteria_data)
+                file_name = os.path.basename(file.name)
+                file_hashes[file_name] = save_uploaded_file(file, os.path.join(upload_dir, file_name))
 
-                # Step 3: Process files in the directory
-                file_summaries = process_files_in_directory(directory)
+            with open(os.path.join(workspace, 'file_hashes.json'), 'w') as hashes_file:
+                json.dump(file_hashes, hashes_file, indent=4)
 
-                # Step 4: Send file chunks to OpenAI for processing
-                send_file_chunks(file_summaries)
+            # Queue the assessment only once its files are in place; a `process_tasks` worker runs the OpenAI workflow
+            task = enqueue_task(data, task_id=task_id)
 
-                # Step 5: Calculate total points
-                total_points = calculate_total_points(criteria_data)
-
-                # Step 6: Finalize summaries and get the AI response
-                final_response = finalize_summaries(total_points, file_summaries, criteria_data)
-
-                # Save the final response (summary) to a JSON file
-                save_response_as_json(final_response, os.path.join(settings.MEDIA_ROOT, 'final_output.json'))
-
-                merge_audit_and_project_data()
-
-                # Step 6: Generate the audit report (Word document)
-                output_path = os.path.join(settings.MEDIA_ROOT, 'generated_audit_report.docx')
-                merged_data_path = os.path.join(settings.MEDIA_ROOT, 'merged_output.json')
-                with open(merged_data_path, 'r', encoding='utf-8') as merged_file:
-                    merged_data = json.load(merged_file)
-                create_word_document(merged_data, output_path)
-
-                # Set task status to completed and include the output file link
-                task_statuses[task_id] = {
-                    'status': 'completed',
-                    'file_url': f"{request.build_absolute_uri('/media/generated_audit_report.docx')}"
-                }
-
-            except Exception as e:
-                task_statuses[task_id] = {'status': 'error', 'message': str(e)}
-
-            # === OpenAI Processing End ===
-
-            return JsonResponse({'status': 'success', 'taskId': task_id, 'message': 'Data and file(s) processed successfully'})
+            return JsonResponse({'status': 'queued', 'taskId': str(task.id), 'message': 'Data and file(s) received, processing has been queued'}, status=202)
 
         except Exception as e:
             # Return error message if an exception occurs
@@ -188,23 +126,21 @@ def upload_data_and_files(request):
 def process_criteria_data(request):
     if request.method == 'GET':
         try:
-            # Path to the data.json file
-            json_file_path = os.path.join(settings.MEDIA_ROOT, 'data.json')
-
-            # Read the data.json file to get the auditCriteria ID
-            with open(json_file_path, 'r') as file:
-                data = json.load(file)
-                audit_criteria_id = data.get('auditCriteria')
+            # The criteria can be given directly or looked up from a queued task
+            audit_criteria_id = request.GET.get('criteria_id')
+            task_id = request.GET.get('task_id')
+            if not audit_criteria_id and task_id:
+                try:
+                    task = ProcessingTask.objects.only('project_data').get(pk=task_id)
+                except (ProcessingTask.DoesNotExist, ValidationError):
+                    return JsonResponse({'status': 'error', 'message': 'Task not found'}, status=404)
+                audit_criteria_id = task.project_data.get('auditCriteria')
 
             if not audit_criteria_id:
-                return JsonResponse({'status': 'error', 'message': 'Audit criteria ID not found in data.json'},
-                                    status=404)
+                return JsonResponse({'status': 'error', 'message': 'Audit criteria ID not found'}, status=404)
 
-            # Establish database connection
-            conn = get_db_connection()
-
-            # Fetch comprehensive criteria data from the database
-            criteria_data = get_comprehensive_criteria_data(conn, audit_criteria_id)
+            # Fetch comprehensive criteria data (cached in memory)
+            criteria_data = get_criteria_context(audit_criteria_id)
 
             if criteria_data:
                 return JsonResponse({'status': 'success', 'data': criteria_data})
@@ -213,27 +149,102 @@ def process_criteria_data(request):
                     {'status': 'error', 'message': 'Failed to retrieve data for the given audit criteria ID'},
                     status=500)
 
-        except FileNotFoundError:
-            return JsonResponse({'status': 'error', 'message': 'data.json file not found'}, status=404)
-        except json.JSONDecodeError:
-            return JsonResponse({'status': 'error', 'message': 'Invalid JSON in data.json file'}, status=400)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     else:
         return JsonResponse({'status': 'error', 'message': 'Only GET method is accepted'}, status=405)
 
+def task_status_data(task, request):
+    """
+    Builds the status payload returned to the frontend for a task.
+    """
+    data = {
+        'status': task.status,
+        'stage': task.stage,
+        'progress': {
+            'current': task.progress_current,
+            'total': task.progress_total,
+            'detail': task.progress_detail,
+        },
+        'stage_timings': task.stage_timings,
+        'metrics': task.metrics,
+        'created_at': task.created_at.isoformat(),
+        'started_at': task.started_at.isoformat() if task.started_at else None,
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+    }
+    if task.status == ProcessingTask.STATUS_COMPLETED:
+        data['file_url'] = request.build_absolute_uri(settings.MEDIA_URL + task.output_file)
+        # Best passages per evidence requirement (file_upload_app.coverage)
+        try:
+            with open(task_workspace_path(task.id, 'evidence_coverage.json'), 'r', encoding='utf-8') as coverage_file:
+                data['evidence_coverage'] = json.load(coverage_file)
+        except FileNotFoundError:
+            data['evidence_coverage'] = None
+    elif task.status == ProcessingTask.STATUS_ERROR:
+        data['message'] = task.message
+    return data
+
 @csrf_exempt
 def check_task_status(request, task_id):
     print(f"Checking status for task: {task_id}")  # Log the task_id being checked
     if request.method == 'GET':
-        # Check if the task exists
-        if task_id in task_statuses:
-            print(f"Task {task_id} found with status: {task_statuses[task_id]}")
-            # Return the status of the task
-            return JsonResponse(task_statuses[task_id])
-        else:
+        try:
+            # Single primary-key lookup, so any worker process can answer
+            task = ProcessingTask.objects.get(pk=task_id)
+        except (ProcessingTask.DoesNotExist, ValidationError):
             print(f"Task {task_id} not found")
             return JsonResponse({'status': 'error', 'message': 'Task not found'}, status=404)
 
-    return JsonResponse({'status': 'error', 'message': 'Only GET method is accepted'}, status=405)
\ No newline at end of file
+        return JsonResponse(task_status_data(task, request))
+
+    return JsonResponse({'status': 'error', 'message': 'Only GET method is accepted'}, status=405)
+
+
+async def stream_task_events(task, request):
+    """
+    Yields Server-Sent Events for a task: the current status first, then every
+    stage or progress change, until the task completes or fails.
+    """
+    task_id = task.pk
+    queue = task_event_hub.subscribe(task_id)
+    last_data = None
+    try:
+        while True:
+            if task is None:
+                yield f"event: error\ndata: {json.dumps({'status': 'error', 'message': 'Task not found'})}\n\n"
+                return
+
+            data = task_status_data(task, request)
+            if data != last_data:
+                yield f"event: status\ndata: {json.dumps(data)}\n\n"
+                last_data = data
+            if task.status in (ProcessingTask.STATUS_COMPLETED, ProcessingTask.STATUS_ERROR):
+                return
+
+            try:
+                task = await asyncio.wait_for(queue.get(), timeout=settings.TASK_EVENTS_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Comment line so proxies and browsers keep the connection open
+                yield ": keep-alive\n\n"
+    finally:
+        task_event_hub.unsubscribe(task_id, queue)
+
+
+@csrf_exempt
+async def task_events(request, task_id):
+    """
+    Streams a task's progress as Server-Sent Events. The stream closes once the task has finished.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Only GET method is accepted'}, status=405)
+
+    try:
+        task = await ProcessingTask.objects.defer('project_data').aget(pk=task_id)
+    except (ProcessingTask.DoesNotExist, ValidationError):
+        return JsonResponse({'status': 'error', 'message': 'Task not found'}, status=404)
+
+    response = StreamingHttpResponse(stream_task_events(task, request), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
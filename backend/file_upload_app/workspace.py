@@ -0,0 +1,42 @@
+from django.conf import settings
+import os
+import shutil
+
+# Every task works in MEDIA_ROOT/tasks/<task_id>/ so concurrent uploads never share files
+TASKS_DIR = 'tasks'
+
+
+def task_workspace_relpath(task_id, *parts):
+    """
+    Returns a path inside the task's workspace, relative to MEDIA_ROOT (for building media URLs).
+    """
+    return '/'.join([TASKS_DIR, str(task_id), *parts])
+
+
+def task_workspace_path(task_id, *parts):
+    """
+    Returns the absolute path of the task's workspace, or of a file inside it.
+    """
+    return os.path.join(settings.MEDIA_ROOT, TASKS_DIR, str(task_id), *parts)
+
+
+def task_upload_dir(task_id):
+    """
+    Returns the directory holding the files uploaded for the task.
+    """
+    return task_workspace_path(task_id, 'uploads')
+
+
+def create_task_workspace(task_id):
+    """
+    Creates the task's workspace and upload directory and returns the workspace path.
+    """
+    os.makedirs(task_upload_dir(task_id), exist_ok=True)
+    return task_workspace_path(task_id)
+
+
+def remove_task_workspace(task_id):
+    """
+    Deletes the task's workspace and everything in it.
+    """
+    shutil.rmtree(task_workspace_path(task_id), ignore_errors=True)
@@ -24,5 +24,5 @@ else
 fi
 
 echo "Starting Gunicorn server"
-exec gunicorn -b 0.0.0.0:8000 --timeout 120 -k gevent baneservice.wsgi:application
+exec gunicorn -b 0.0.0.0:8000 --timeout 120 -k uvicorn.workers.UvicornWorker baneservice.asgi:application
 
@@ -7,34 +7,62 @@ const Processing = () => {
 
     const [loading, setLoading] = useState(true);
     const [fileUrl, setFileUrl] = useState('');
+    const [progress, setProgress] = useState('');
+    const [errorMessage, setErrorMessage] = useState('');
 
     useEffect(() => {
         if (taskId) {
-            // Start polling the backend for task status
-            const interval = setInterval(async () => {
-                try {
-                    const response = await fetch(`http://127.0.0.1:8000/api/task-status/${taskId}`);
-                    const result = await response.json();
-                    if (result.status === 'completed') {
-                        setFileUrl(result.file_url);
-                        setLoading(false);
-                    }
-                } catch (error) {
-                    console.error('Feil ved henting av oppgavestatus:', error);
+            // Subscribe to the backend's progress stream; it closes when the task is finished
+            const events = new EventSource(`${process.env.NEXT_PUBLIC_BACKEND_URL}/api/task-events/${taskId}/`);
+
+            events.addEventListener('status', (event) => {
+                const result = JSON.parse((event as MessageEvent).data);
+                if (result.status === 'completed') {
+                    setFileUrl(result.file_url);
+                    setLoading(false);
+                    events.close();
+                } else if (result.status === 'error') {
+                    setErrorMessage(result.message);
+                    events.close();
+                } else {
+                    setProgress(result.progress.detail || result.stage);
+                }
+            });
+
+            events.addEventListener('error', (event) => {
+                // Named 'error' events come from the backend; plain errors are connection drops that EventSource retries
+                const data = (event as MessageEvent).data;
+                if (data) {
+                    setErrorMessage(JSON.parse(data).message);
+                    events.close();
+                } else {
+                    console.error('Feil ved henting av oppgavestatus:', event);
                 }
-            }, 5000);  // Poll every 5 seconds
+            });
 
-            return () => clearInterval(interval);  // Cleanup on component unmount
+            return () => events.close();  // Cleanup on component unmount
         }
     }, [taskId]);
 
     return (
         <div className="flex flex-col items-center justify-center min-h-screen bg-gray-100">
-            {loading ? (
+            {errorMessage ? (
+                <div className="text-center">
+                    <h1 className="text-2xl font-bold mb-4">Behandlingen feilet</h1>
+                    <p className="text-gray-700 mb-4">{errorMessage}</p>
+                    <button
+                        onClick={() => router.push('/')}
+                        className="mt-4 bg-gray-500 hover:bg-gray-700 text-white font-bold py-2 px-4 rounded"
+                    >
+                        Send inn et nytt prosjekt
+                    </button>
+                </div>
+            ) : loading ? (
                 <div className="flex flex-col items-center">
                     {/* Tailwind CSS spinner */}
                     <div className="animate-spin rounded-full h-32 w-32 border-t-4 border-blue-500 border-solid border-r-transparent"></div>
                     <p className="text-xl font-semibold mt-6 text-gray-700">Behandler... Vennligst vent.</p>
+                    {progress && <p className="text-sm mt-2 text-gray-500">{progress}</p>}
                 </div>
             ) : (
                 <div className="text-center">